@@ -0,0 +1,99 @@
+import glob
+import json
+import os
+import threading
+from collections import namedtuple
+
+import prompt_layout
+
+# One JSON file per assignment: assignment_id, title, learning_material_file
+# (relative to the config directory), expert_summary and key_concepts
+DEFAULT_CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "assignments")
+
+# Everything the prompts need about one assignment, built once per run
+ContextBundle = namedtuple("ContextBundle", ["assignment_id", "title", "learning_material", "expert_summary",
+                                             "key_concepts", "key_concepts_text", "token_count"])
+
+
+class AssignmentRegistry:
+    """
+    Maps AssignmentID to the context bundle of that assignment.
+
+    Only the small JSON specs are read up front; the learning material of an
+    assignment is read, and its bundle built, the first time the assignment is
+    asked for. Bundles are memoized, so every call of a run shares the same strings.
+    """
+
+    def __init__(self, config_dir: str = DEFAULT_CONFIG_DIR):
+        self.config_dir = config_dir
+        self._specs = {}
+        for path in sorted(glob.glob(os.path.join(config_dir, "*.json"))):
+            with open(path, "r", encoding='utf-8') as f:
+                spec = json.load(f)
+            self._specs[int(spec["assignment_id"])] = spec
+        if not self._specs:
+            raise ValueError("No assignment configs (*.json) found in {}".format(config_dir))
+        self._bundles = {}
+        self._lock = threading.Lock()
+
+    def ids(self) -> list:
+        """Returns the configured AssignmentIDs."""
+        return sorted(self._specs)
+
+    def bundle(self, assignment_id) -> ContextBundle:
+        """
+        Returns the context bundle of an assignment, building it on first use.
+
+        Raises:
+            ValueError: If no assignment with that id is configured.
+        """
+        bundle = self._bundles.get(assignment_id)
+        if bundle is not None:
+            return bundle
+        with self._lock:
+            if assignment_id not in self._bundles:
+                self._bundles[assignment_id] = self._build(assignment_id)
+            return self._bundles[assignment_id]
+
+    def _build(self, assignment_id):
+        spec = self._specs.get(assignment_id)
+        if spec is None:
+            raise ValueError("No assignment config for AssignmentID {!r} in {}".format(assignment_id, self.config_dir))
+        with open(os.path.join(self.config_dir, spec["learning_material_file"]), "r", encoding='utf-8') as f:
+            learning_material = f.read()
+        key_concepts = tuple(spec["key_concepts"])
+        key_concepts_text = ", ".join(key_concepts)
+        return ContextBundle(assignment_id=assignment_id,
+                             title=spec.get("title", ""),
+                             learning_material=learning_material,
+                             expert_summary=spec["expert_summary"],
+                             key_concepts=key_concepts,
+                             key_concepts_text=key_concepts_text,
+                             token_count=sum(prompt_layout.count_tokens(text) for text in
+                                             (learning_material, spec["expert_summary"], key_concepts_text)))
+
+
+_registry = None
+_registry_dir = DEFAULT_CONFIG_DIR
+_registry_lock = threading.Lock()
+
+
+def configure(config_dir: str = DEFAULT_CONFIG_DIR):
+    """Points the shared registry at a config directory; it is loaded on first use."""
+    global _registry, _registry_dir
+    with _registry_lock:
+        _registry, _registry_dir = None, config_dir
+
+
+def get_registry() -> AssignmentRegistry:
+    """Returns the shared registry, loading it from the configured directory on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AssignmentRegistry(_registry_dir)
+        return _registry
+
+
+def get_bundle(assignment_id) -> ContextBundle:
+    """Returns the memoized context bundle of an assignment from the shared registry."""
+    return get_registry().bundle(assignment_id)
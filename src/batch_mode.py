@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Batch states after which polling stops
+FINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def make_client(base_url: str = None, api_key: str = None):
+    """
+    Creates the OpenAI client used for batch submission.
+
+    Args:
+        base_url (str): API base URL, e.g. a local stand-in server ("http://127.0.0.1:8089/v1").
+        api_key (str): API key; defaults to the OPENAI_API_KEY environment variable.
+    """
+    import openai
+
+    return openai.OpenAI(base_url=base_url, api_key=api_key or os.environ.get("OPENAI_API_KEY") or "batch-stand-in")
+
+
+def build_request(custom_id: str, model: str, temperature, prompt: str, response_format: dict = None) -> dict:
+    """Builds one line of a batch input file: a chat completion request for a single prompt."""
+    body = {"model": model, "messages": [ {"role": "user", "content": prompt} ]}
+    if temperature is not None:
+        body["temperature"] = temperature
+    if response_format is not None:
+        body["response_format"] = response_format
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def write_batch_file(path: str, requests: list):
+    """Writes the batch requests as JSONL."""
+    with open(path, "w", encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def submit(client, path: str, state_path: str = None) -> str:
+    """
+    Uploads a batch input file and starts the batch.
+
+    The batch id is saved to state_path so an interrupted run can resume
+    polling the same batch instead of paying for it twice.
+
+    Returns:
+        str: The batch id.
+    """
+    with open(path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                  completion_window=COMPLETION_WINDOW)
+    if state_path:
+        with open(state_path, "w", encoding='utf-8') as f:
+            json.dump({"batch_id": batch.id, "input_file": path}, f)
+    return batch.id
+
+
+def load_state(state_path: str):
+    """Returns the batch id saved by submit(), or None when there is no pending batch."""
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, "r", encoding='utf-8') as f:
+        return json.load(f)["batch_id"]
+
+
+def wait_for_batch(client, batch_id: str, poll_interval: float = 30.0):
+    """
+    Polls a batch until it reaches a final state.
+
+    Returns:
+        Batch: The final batch object.
+    """
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in FINAL_STATES:
+            return batch
+        counts = batch.request_counts
+        if counts is not None:
+            print("Batch {} {}: {}/{} requests done".format(batch_id, batch.status, counts.completed, counts.total))
+        time.sleep(poll_interval)
+
+
+def read_responses(client, batch) -> tuple:
+    """
+    Downloads the output of a finished batch.
+
+    Returns:
+        tuple: (responses, errors) where responses maps custom_id to the response
+            text and errors maps custom_id to an error description.
+    """
+    responses, errors = {}, {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if entry.get("error") or response.get("status_code") != 200:
+                errors[entry["custom_id"]] = entry.get("error") or response.get("body")
+                continue
+            responses[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return responses, errors
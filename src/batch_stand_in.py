@@ -0,0 +1,131 @@
+"""
+Local stand-in for the OpenAI Files and Batch endpoints, for exercising batch mode without an API key.
+
+Run it and point run_assessment.py at it:
+
+    python src/batch_stand_in.py --port 8089
+    python src/run_assessment.py --batch --batch-base-url http://127.0.0.1:8089/v1 --batch-poll 1
+
+Batches complete on the second status check, and every request is answered
+with a deterministic, schema-valid evaluation derived from its prompt.
+"""
+import argparse
+import email.parser
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mock_backend import fake_completion
+
+_files = {}
+_batches = {}
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+
+def _run_batch(batch):
+    lines = []
+    for line in _files[batch["input_file_id"]]["content"].decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        content = fake_completion(request["body"]["messages"][-1]["content"])
+        lines.append(json.dumps({
+            "id": "resp-{}".format(next(_ids)),
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": {
+                "object": "chat.completion",
+                "model": request["body"]["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+            }},
+            "error": None,
+        }))
+    output = _new_file("batch_output.jsonl", "batch_output", ("\n".join(lines) + "\n").encode('utf-8'))
+    batch.update(status="completed", output_file_id=output["id"], completed_at=int(time.time()),
+                 request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+
+
+def _new_file(filename, purpose, content):
+    file_object = {"id": "file-{}".format(next(_ids)), "object": "file", "bytes": len(content),
+                   "created_at": int(time.time()), "filename": filename, "purpose": purpose}
+    _files[file_object["id"]] = dict(file_object, content=content)
+    return file_object
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _public(self, record):
+        return {key: value for key, value in record.items() if key != "content"}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with _lock:
+            if self.path.endswith("/files"):
+                # Multipart upload: parse it with the stdlib MIME parser
+                message = email.parser.BytesParser().parsebytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body)
+                fields = {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+                upload = fields["file"]
+                purpose = fields["purpose"].get_payload(decode=True).decode() if "purpose" in fields else "batch"
+                return self._send_json(self._public(_new_file(upload.get_filename(), purpose, upload.get_payload(decode=True))))
+            if self.path.endswith("/batches"):
+                request = json.loads(body)
+                batch = {"id": "batch-{}".format(next(_ids)), "object": "batch", "endpoint": request["endpoint"],
+                         "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                         "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+                         "error_file_id": None, "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                         "_polls": 0}
+                _batches[batch["id"]] = batch
+                return self._send_json({k: v for k, v in batch.items() if not k.startswith("_")})
+        self._send_json({"error": {"message": "Not found"}}, status=404)
+
+    def do_GET(self):
+        with _lock:
+            match = re.search(r"/batches/([^/]+)$", self.path)
+            if match and match.group(1) in _batches:
+                batch = _batches[match.group(1)]
+                batch["_polls"] += 1
+                if batch["status"] == "in_progress" and batch["_polls"] >= 2:
+                    _run_batch(batch)
+                return self._send_json({k: v for k, v in batch.items() if not k.startswith("_")})
+            match = re.search(r"/files/([^/]+)/content$", self.path)
+            if match and match.group(1) in _files:
+                content = _files[match.group(1)]["content"]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+        self._send_json({"error": {"message": "Not found"}}, status=404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8089) -> ThreadingHTTPServer:
+    """Starts the stand-in server on a background thread and returns it."""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Batch API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+    print("Batch stand-in listening on http://{}:{}/v1".format(args.host, args.port))
+    ThreadingHTTPServer((args.host, args.port), StandInHandler).serve_forever()
@@ -0,0 +1,245 @@
+"""
+Benchmark of prompt strategies on throughput, cost and agreement with the human grades.
+
+Every selected strategy grades the same seeded sample of learners, with the
+response cache off so each strategy pays for its own calls. The results are
+printed as a Markdown table and appended to a CSV keyed by commit, so numbers
+can be tracked over time:
+
+    python src/benchmark.py --backend mock --strategies SR4,SR5,Cascade --sample 40
+"""
+import argparse
+import csv
+import datetime
+import math
+import os
+import subprocess
+import time
+
+import assignments
+import evaluation_engine
+import learner_records
+import llm_client
+import material_retrieval
+import prompt_layout
+import prompt_templates
+import run_assessment
+import strategies
+import telemetry
+
+# Human grade column (average of two raters) for each criterion
+HUMAN_COLUMNS = {"Content Quality": "Content-quality-ave",
+                 "Content Coverage": "Content-coverage-ave",
+                 "Content Coherence": "Content-coherence-ave",
+                 "Argument": "Argument-ave"}
+
+DEFAULT_OUTPUT = os.path.join(run_assessment.parent_dir, "data", "benchmarks.csv")
+
+COLUMNS = ["timestamp", "commit", "backend", "strategy", "summaries", "seed", "wall_s", "calls", "calls_per_summary",
+           "p50_latency_s", "p95_latency_s", "input_tokens", "cached_input_tokens", "output_tokens",
+           "failed", "exact", "within_1", "qwk"]
+
+
+def human_score(value):
+    """
+    Rounds a human average grade to a rubric level, half up (2.5 -> 3).
+
+    Returns None for missing grades (blank or ".").
+    """
+    try:
+        return int(math.floor(float(value) + 0.5))
+    except (TypeError, ValueError):
+        return None
+
+
+def quadratic_weighted_kappa(rater_a: list, rater_b: list, min_rating: int = 0, max_rating: int = 5) -> float:
+    """Cohen's kappa with quadratic weights between two lists of integer ratings."""
+    n = len(rater_a)
+    if n == 0:
+        return 0.0
+    levels = max_rating - min_rating + 1
+    observed = [[0] * levels for _ in range(levels)]
+    for a, b in zip(rater_a, rater_b):
+        observed[a - min_rating][b - min_rating] += 1
+    histogram_a = [sum(row) for row in observed]
+    histogram_b = [sum(observed[i][j] for i in range(levels)) for j in range(levels)]
+
+    numerator = denominator = 0.0
+    for i in range(levels):
+        for j in range(levels):
+            weight = (i - j) ** 2 / float((levels - 1) ** 2)
+            numerator += weight * observed[i][j] / n
+            denominator += weight * histogram_a[i] * histogram_b[j] / (n * n)
+    return 1.0 - numerator / denominator if denominator else 1.0
+
+
+def agreement(pairs: list) -> dict:
+    """
+    Agreement between model and human scores.
+
+    Args:
+        pairs (list): (model score, human score) integer pairs.
+
+    Returns:
+        dict: exact and within_1 shares, and the quadratic weighted kappa.
+    """
+    if not pairs:
+        return {"exact": 0.0, "within_1": 0.0, "qwk": 0.0}
+    model, human = [a for a, _ in pairs], [b for _, b in pairs]
+    return {"exact": sum(1 for a, b in pairs if a == b) / len(pairs),
+            "within_1": sum(1 for a, b in pairs if abs(a - b) <= 1) / len(pairs),
+            "qwk": quadratic_weighted_kappa(model, human)}
+
+
+def run_strategy(name: str, records: list, concurrency: int, multi_criterion: bool = False) -> dict:
+    """
+    Grades the records with one strategy and measures it.
+
+    Returns:
+        dict: One benchmark row (see COLUMNS, without timestamp, commit, backend and seed).
+    """
+    strategy = strategies.load(name)
+    multi_criterion = multi_criterion and name in strategies.MULTI_CRITERION
+
+    def evaluate(job):
+        record, indices = job
+        try:
+            with telemetry.call_context(strategy=name, criterion=", ".join(run_assessment.criterions[i] for i in indices),
+                                        row=record.row):
+                return run_assessment.evaluate_job(strategy, job)
+        except ValueError:
+            return None
+        except Exception as error:
+            # Counted as failed like an unparseable reply, once retries are used up
+            if not llm_client.is_retryable(error):
+                raise
+            return None
+
+    pairs, failed = [], 0
+    started = time.monotonic()
+    jobs = run_assessment.make_jobs(records, {}, multi_criterion)
+    for (record, indices), job_results in evaluation_engine.iter_results(jobs, evaluate, concurrency):
+        if job_results is None:
+            failed += len(indices)
+            continue
+        for i, result in zip(indices, job_results):
+            human = human_score(record.fields.get(HUMAN_COLUMNS[run_assessment.criterions[i]]))
+            if human is not None:
+                pairs.append((int(result["score"]), human))
+    wall = time.monotonic() - started
+
+    calls = [entry for entry in telemetry.records() if entry.get("strategy") == name]
+    usage = telemetry.summary(calls)
+    # Model calls of this strategy that got a response, including rate-limit waits and retries
+    latencies = [entry["wall_s"] for entry in calls
+                 if not entry["cache_hit"] and entry.get("error") in (None, "unparseable")]
+    return dict({"strategy": name,
+                 "summaries": len(records),
+                 "wall_s": round(wall, 2),
+                 "calls": usage["calls"],
+                 "calls_per_summary": round(usage["calls"] / len(records), 2) if records else 0.0,
+                 "p50_latency_s": round(telemetry.percentile(latencies, 50), 3),
+                 "p95_latency_s": round(telemetry.percentile(latencies, 95), 3),
+                 "input_tokens": usage["input_tokens"],
+                 "cached_input_tokens": usage["cached_input_tokens"],
+                 "output_tokens": usage["output_tokens"],
+                 "failed": failed},
+                **{key: round(value, 3) for key, value in agreement(pairs).items()})
+
+
+def current_commit() -> str:
+    """Short hash of the checked-out commit, or "" outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=run_assessment.parent_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def format_table(rows: list) -> str:
+    """Formats benchmark rows as a Markdown table."""
+    columns = ["strategy", "wall_s", "calls_per_summary", "p50_latency_s", "p95_latency_s",
+               "input_tokens", "output_tokens", "failed", "exact", "within_1", "qwk"]
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for row in rows:
+        lines.append("| " + " | ".join(str(row[column]) for column in columns) + " |")
+    return "\n".join(lines)
+
+
+def append_rows(path: str, rows: list):
+    """Appends benchmark rows to a CSV file, writing the header when the file is new."""
+    new = not os.path.exists(path)
+    with open(path, "a", encoding='utf-8', newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if new:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare prompt strategies on throughput, cost and agreement with human grades.")
+    parser.add_argument("--strategies", default=",".join(strategies.names()),
+                        help="Comma-separated strategies to compare (default: all).")
+    parser.add_argument("--input", default=run_assessment.INPUT_PATH)
+    parser.add_argument("--sheet", default=run_assessment.INPUT_SHEET)
+    parser.add_argument("--assignments", default=assignments.DEFAULT_CONFIG_DIR)
+    parser.add_argument("--sample", type=int, default=40,
+                        help="Number of learners in the fixed sample (default: %(default)s).")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed of the sample (default: %(default)s).")
+    parser.add_argument("--concurrency", type=int, default=run_assessment.MAX_CONCURRENCY)
+    parser.add_argument("--multi-criterion", action="store_true",
+                        help="Score all criteria of a learner in one call with SR4 and SR5; other strategies score each criterion separately.")
+    parser.add_argument("--prompts", default=prompt_templates.DEFAULT_TEMPLATE_DIR, metavar="DIR",
+                        help="Directory of prompt template files, one <strategy>.txt per strategy (default: data/prompts/).")
+    parser.add_argument("--material-budget", type=int, default=None, metavar="TOKENS",
+                        help="Send only the most relevant passages of the learning material, up to this many tokens "
+                             "(default: full material).")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None, metavar="TOKENS",
+                        help="Token budget per prompt, trimmed as in run_assessment.py (default: no budget).")
+    parser.add_argument("--backend", default="mock", choices=["openai", "mock"],
+                        help="Model backend (default: %(default)s, no API key needed).")
+    parser.add_argument("--mock", action="append", default=[], metavar="SETTING=VALUE",
+                        help="Mock backend setting, e.g. latency_median=0.2 (repeatable).")
+    parser.add_argument("--cache", action="store_true",
+                        help="Use the response cache (by default every strategy makes all of its calls).")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="CSV file the results are appended to (default: data/benchmarks.csv).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    assignments.configure(args.assignments)
+    material_retrieval.configure(args.material_budget)
+    prompt_layout.configure(args.max_prompt_tokens)
+    try:
+        prompt_templates.configure(args.prompts)
+    except ValueError as error:
+        raise SystemExit(str(error))
+    names = [name.strip() for name in args.strategies.split(",") if name.strip()]
+    for name in names:
+        strategies.load(name)
+
+    llm_client.configure_backend(args.backend, **run_assessment.mock_settings(args.mock))
+    llm_client.configure_cache(enabled=args.cache)
+    llm_client.configure_calls(max_in_flight=args.concurrency)
+    telemetry.configure()
+
+    rows = run_assessment.select_rows(learner_records.count_records(args.input, args.sheet), sample=args.sample, seed=args.seed)
+    records = list(learner_records.iter_records(args.input, args.sheet, set(rows)))
+
+    shared = {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"), "commit": current_commit(),
+              "backend": args.backend, "seed": args.seed}
+    results = []
+    for name in names:
+        print("Benchmarking {} on {} summaries...".format(name, len(records)))
+        results.append(dict(shared, **run_strategy(name, records, args.concurrency, args.multi_criterion)))
+
+    print(format_table(results))
+    append_rows(args.output, results)
+    print("Appended {} rows to {}".format(len(results), args.output))
+
+
+if __name__ == "__main__":
+    main()
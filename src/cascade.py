@@ -0,0 +1,157 @@
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import evaluation_schema
+import llm_client
+import strategies
+import telemetry
+
+OPENAI_API_KEY = ""
+
+# Cheap first-stage model; the client is created on first use and shared through llm_client
+MODEL = "gpt-4.1-mini"
+TEMPERATURE = 0.3
+
+# Prompt strategies the cheap model scores every evaluation with; two different
+# prompts give an independent second opinion that still hits the response cache on reruns
+FIRST_STAGE = ("SR4", "nCoT4")
+# Strategy that re-scores uncertain evaluations with its own (stronger) model;
+# "CoT4" escalates to CoT self-consistency instead
+ESCALATE_TO = "SR5"
+# Escalate when the first-stage scores differ by more than this
+MAX_SPREAD = 1
+# Escalate when the first-stage score lands on one of these rubric levels
+BORDERLINE_SCORES = ()
+
+# The cascade makes several dependent calls per evaluation, so it cannot be batched or merged across criteria
+MULTI_STAGE = True
+
+logger = logging.getLogger(__name__)
+
+_escalations = Counter()
+_escalations_lock = threading.Lock()
+
+
+def get_chat():
+    return llm_client.get_chat(MODEL, TEMPERATURE, OPENAI_API_KEY)
+
+
+def configure(escalate_to: str = None, max_spread: int = None, borderline_scores=None):
+    """
+    Overrides the escalation settings of the cascade.
+
+    Args:
+        escalate_to (str): Strategy name used for uncertain evaluations.
+        max_spread (int): Largest first-stage score spread accepted without escalating.
+        borderline_scores: Rubric levels that always escalate.
+
+    Raises:
+        ValueError: If escalate_to is unknown or is itself a multi-stage strategy such as Cascade,
+            which would escalate again on every uncertain evaluation.
+    """
+    global ESCALATE_TO, MAX_SPREAD, BORDERLINE_SCORES
+    if escalate_to is not None:
+        if getattr(strategies.load(escalate_to), "MULTI_STAGE", False):
+            raise ValueError("Cascade cannot escalate to the multi-stage strategy {}".format(escalate_to))
+        ESCALATE_TO = escalate_to
+    if max_spread is not None:
+        MAX_SPREAD = max_spread
+    if borderline_scores is not None:
+        BORDERLINE_SCORES = tuple(borderline_scores)
+
+
+def _first_stage(name):
+    return strategies.load(name)
+
+
+def stages() -> list:
+    """Prompt modules the cascade may send prompts of: the first-stage strategies, then the escalation strategy."""
+    return [_first_stage(name) for name in FIRST_STAGE] + [strategies.load(ESCALATE_TO)]
+
+
+def build_prompt(criterion, definition, score_guide, learning_material, expert_summary, key_concepts, learner_summary):
+    # The prompt of the first cheap stage
+    return _first_stage(FIRST_STAGE[0]).build_prompt(criterion, definition, score_guide, learning_material,
+                                                     expert_summary, key_concepts, learner_summary)
+
+
+def get_output_parser():
+    return _first_stage(FIRST_STAGE[0]).get_output_parser()
+
+
+def uncertainty(scores: list):
+    """
+    Checks the first-stage scores for a reason to escalate.
+
+    Args:
+        scores (list): Scores of the first stage, or None for a response that did not parse.
+
+    Returns:
+        str: The escalation reason ("parse failure", "disagreement" or "borderline" when any
+            score is a BORDERLINE_SCORES level), or None to accept.
+    """
+    if any(score is None for score in scores):
+        return "parse failure"
+    if max(scores) - min(scores) > MAX_SPREAD:
+        return "disagreement"
+    if any(score in BORDERLINE_SCORES for score in scores):
+        return "borderline"
+    return None
+
+
+def evaluate_text(criterion: str, definition: str, score_guide: str, learning_material: str, expert_summary: str, key_concepts: list, learner_summary: str) -> dict:
+    """
+    Evaluates a learner's summary with the cheap model first and escalates only when it is uncertain.
+
+    The first-stage prompts are sent to the cheap model at the same time. When
+    the responses agree, the first one is the result; on a parse failure, a score
+    spread above MAX_SPREAD or a BORDERLINE_SCORES level, the evaluation is redone
+    with the ESCALATE_TO strategy.
+
+    Returns:
+        dict: The evaluation result.
+    """
+    inputs = dict(criterion=criterion, definition=definition, score_guide=score_guide,
+                  learning_material=learning_material, expert_summary=expert_summary,
+                  key_concepts=key_concepts, learner_summary=learner_summary)
+
+    def first_stage(name):
+        stage = _first_stage(name)
+        try:
+            return llm_client.invoke(get_chat(), stage.build_prompt(**inputs), stage.get_output_parser().parse,
+                                     response_format=evaluation_schema.EVALUATION_FORMAT)
+        except ValueError as error:
+            logger.info("First-stage %s response for %s did not parse: %s", name, criterion, error)
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(FIRST_STAGE)) as executor:
+        results = list(executor.map(telemetry.propagate(first_stage), FIRST_STAGE))
+    scores = [result["score"] if result is not None else None for result in results]
+
+    reason = uncertainty(scores)
+    with _escalations_lock:
+        _escalations["evaluations"] += 1
+        if reason:
+            _escalations[reason] += 1
+    if reason is None:
+        return results[0]
+    logger.info("Escalating %s to %s (%s, first-stage scores %s)", criterion, ESCALATE_TO, reason, scores)
+    return strategies.load(ESCALATE_TO).evaluate_text(**inputs)
+
+
+def escalation_totals() -> dict:
+    """Returns the number of evaluations and of escalations per reason so far."""
+    with _escalations_lock:
+        return dict(_escalations)
+
+
+def format_escalations(totals: dict) -> str:
+    """Formats escalation_totals() as a one-line summary."""
+    evaluations = totals.get("evaluations", 0)
+    escalated = sum(count for reason, count in totals.items() if reason != "evaluations")
+    reasons = ", ".join("{} {}".format(count, reason) for reason, count in sorted(totals.items()) if reason != "evaluations")
+    return "{} of {} evaluations escalated to {} ({:.0%}){}".format(
+        escalated, evaluations, ESCALATE_TO, escalated / evaluations if evaluations else 0.0,
+        ": " + reasons if reasons else "")
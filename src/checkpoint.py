@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+
+
+class Journal:
+    """
+    Append-only JSONL journal of completed (row, criterion) evaluations.
+
+    Every result is written as one line and flushed to disk before record()
+    returns, so a crashed run loses at most the calls that were in flight.
+    A torn last line left by a crash is ignored on load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def load(self) -> dict:
+        """
+        Reads every completed evaluation from the journal.
+
+        Returns:
+            dict: Maps (row, criterion) to the stored result dict. Later entries win.
+        """
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, "r", encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                completed[(entry["row"], entry["criterion"])] = entry["result"]
+        return completed
+
+    def record(self, row: int, criterion: str, result: dict):
+        """
+        Appends one completed evaluation and syncs it to disk.
+
+        Args:
+            row (int): Row index of the learner in the input sheet.
+            criterion (str): The evaluation criterion.
+            result (dict): The evaluation result returned by evaluate_text.
+        """
+        line = json.dumps({"row": int(row), "criterion": criterion, "result": result}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding='utf-8')
+                if self._file.tell() > 0 and not _ends_with_newline(self.path):
+                    # Terminate a torn line from a crashed run so the next entry stays parseable
+                    self._file.write("\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
@@ -0,0 +1,196 @@
+"""
+Local, deterministic key-concept coverage of learner summaries.
+
+Summaries are matched against the assignment's key concepts and expert summary
+without any model call. Words are lowercased and reduced to a rough lemma, and
+two longer words match when they start with the same letter and are one typing
+edit apart, so misspelled concepts such as "evalutation model" or "pedictive
+analytic" still match "evaluation models" and "predictive analytics" while
+"descriptive" and "prescriptive" stay apart. Matching works on vocabularies:
+each distinct word of a sheet is compared with an assignment's concept and
+expert words once, and every summary is then scored by set lookups.
+
+Run it on its own to write coverage features for every learner:
+
+    python src/concept_coverage.py --output data/coverage.csv
+"""
+import argparse
+import csv
+import functools
+import re
+from collections import namedtuple
+
+import assignments
+import learner_records
+
+# Words shorter than this only match exactly; shorter ones one edit apart are too often
+# different words (learner/learned, content/context)
+MIN_FUZZY_LENGTH = 8
+# Most edits (inserted, deleted, replaced or swapped letters) between a word and its misspelling;
+# two already match different words of one stem (evaluation/evaluator, instruction/instructor)
+MAX_EDITS = 1
+# Summaries shorter than this are screened out as empty
+MIN_WORDS = 10
+# Summaries with no key concept and less of the expert summary's vocabulary than this are screened out as off-topic
+MIN_EXPERT_OVERLAP = 0.05
+
+# Irregular plurals that the suffix rules below would get wrong
+IRREGULAR_LEMMAS = {"data": "datum", "criteria": "criterion", "analyses": "analysis", "theses": "thesis"}
+
+STOPWORDS = frozenset("""a an and are as at be been but by can do does for from has have how if in into is it its
+may more most not of on or such than that the their them then there these they this those to was were what when
+which while who will with would""".split())
+
+# Output columns written by feature_columns()
+FEATURE_COLUMNS = ("KeyConcept_Coverage", "KeyConcept_Matches", "ExpertSummary_Overlap", "Summary_Words")
+
+Coverage = namedtuple("Coverage", ["word_count", "matched_concepts", "concept_coverage", "expert_overlap"])
+
+
+def lemma(word: str) -> str:
+    """Rough lemma of a lowercased word: irregular plurals and common plural endings are reduced."""
+    if word in IRREGULAR_LEMMAS:
+        return IRREGULAR_LEMMAS[word]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("sses"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def words(text: str) -> list:
+    """Lemmatized words of text; hyphenated words are split into their parts."""
+    return [lemma(word) for word in re.findall(r"[a-z0-9]+", str(text).lower())]
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Edits between two words: inserted, deleted or replaced letters and swapped neighbouring letters."""
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        before, previous = previous, current
+    return previous[-1]
+
+
+def similar(a: str, b: str) -> bool:
+    """Whether two lemmatized words are the same word, allowing for small misspellings."""
+    if a == b:
+        return True
+    # Misspellings keep the first letter; this also keeps descriptive/prescriptive and formative/normative apart
+    if min(len(a), len(b)) < MIN_FUZZY_LENGTH or a[0] != b[0]:
+        return False
+    return abs(len(a) - len(b)) <= MAX_EDITS and edit_distance(a, b) <= MAX_EDITS
+
+
+# Bounded, since the vocabulary of a long-running process is open-ended
+@functools.lru_cache(maxsize=65536)
+def _matches(word: str, targets: frozenset) -> frozenset:
+    """The target words that word matches, compared once per distinct word and set of targets."""
+    return frozenset(target for target in targets if similar(word, target))
+
+
+def contains_phrase(summary_words: list, phrase: tuple, matches: dict) -> bool:
+    """
+    Whether the phrase words occur consecutively in the summary, word by word allowing misspellings.
+
+    Args:
+        matches (dict): Maps every summary word to the target words it matches.
+    """
+    n = len(phrase)
+    for start in range(len(summary_words) - n + 1):
+        if all(phrase[i] in matches[summary_words[start + i]] for i in range(n)):
+            return True
+    return False
+
+
+def coverage(summary: str, key_concepts, expert_summary: str) -> Coverage:
+    """
+    Scores one learner summary against key concepts and an expert summary.
+
+    Args:
+        summary (str): The learner summary.
+        key_concepts: The assignment's key concepts (list of phrases).
+        expert_summary (str): The expert summary.
+
+    Returns:
+        Coverage: Word count, the matched key concepts, the fraction of key concepts
+            matched, and the fraction of the expert summary's content words found in the summary.
+    """
+    key_concepts = tuple(key_concepts)
+    phrases, expert_terms, targets = _targets(key_concepts, expert_summary)
+    summary_words = words(summary)
+    matches = {word: _matches(word, targets) for word in set(summary_words)}
+    matched = [concept for concept, phrase in zip(key_concepts, phrases) if contains_phrase(summary_words, phrase, matches)]
+    found = len(expert_terms & frozenset().union(*matches.values()))
+    return Coverage(word_count=len(summary_words),
+                    matched_concepts=matched,
+                    concept_coverage=len(matched) / len(key_concepts) if key_concepts else 0.0,
+                    expert_overlap=found / len(expert_terms) if expert_terms else 0.0)
+
+
+@functools.lru_cache(maxsize=64)
+def _targets(key_concepts: tuple, expert_summary: str):
+    # The concept phrases as words, the expert summary's content terms, and every word a summary word can match
+    phrases = tuple(tuple(words(concept)) for concept in key_concepts)
+    expert_terms = _content_terms(expert_summary)
+    return phrases, expert_terms, frozenset(word for phrase in phrases for word in phrase) | expert_terms
+
+
+@functools.lru_cache(maxsize=64)
+def _content_terms(text: str) -> frozenset:
+    return frozenset(word for word in words(text) if word not in STOPWORDS and not word.isdigit())
+
+
+def screen(cov: Coverage):
+    """
+    Decides whether a summary is obviously empty or off-topic.
+
+    Returns:
+        str: The reason to skip grading it with the model, or None to grade it normally.
+    """
+    if cov.word_count < MIN_WORDS:
+        return "The summary is empty or too short to evaluate ({} words).".format(cov.word_count)
+    if not cov.matched_concepts and cov.expert_overlap < MIN_EXPERT_OVERLAP:
+        return "The summary mentions none of the key concepts and is off-topic for the assignment."
+    return None
+
+
+def record_coverage(record) -> Coverage:
+    """Scores a learner record against the context bundle of its assignment."""
+    bundle = assignments.get_bundle(record.assignment_id)
+    return coverage(record.summary, bundle.key_concepts, bundle.expert_summary)
+
+
+def feature_columns(cov: Coverage) -> dict:
+    """Coverage features as output columns (FEATURE_COLUMNS)."""
+    return dict(zip(FEATURE_COLUMNS, (round(cov.concept_coverage, 3), "; ".join(cov.matched_concepts),
+                                      round(cov.expert_overlap, 3), cov.word_count)))
+
+
+if __name__ == "__main__":
+    import run_assessment
+
+    parser = argparse.ArgumentParser(description="Write key-concept coverage features for every learner summary.")
+    parser.add_argument("--input", default=run_assessment.INPUT_PATH)
+    parser.add_argument("--sheet", default=run_assessment.INPUT_SHEET)
+    parser.add_argument("--assignments", default=assignments.DEFAULT_CONFIG_DIR)
+    parser.add_argument("--output", required=True, help="CSV file to write.")
+    args = parser.parse_args()
+
+    assignments.configure(args.assignments)
+    with open(args.output, "w", encoding='utf-8', newline="") as f:
+        writer = None
+        for record in learner_records.iter_records(args.input, args.sheet):
+            cov = record_coverage(record)
+            row = dict({"row": record.row, "AssignmentID": record.assignment_id}, **feature_columns(cov),
+                       Screened=screen(cov) or "")
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
@@ -0,0 +1,202 @@
+"""
+Exact and near-duplicate learner summaries within an assignment.
+
+Summaries are normalized (Unicode, case, punctuation and whitespace) and rows
+of the same AssignmentID with the same normalized text form a group of exact
+duplicates. Near-duplicates, such as a resubmission with a few words changed,
+are found with MinHash signatures over word shingles: locality-sensitive
+hashing proposes candidate pairs and their exact shingle Jaccard similarity
+decides. Each group is graded once, through its first row.
+
+Run it on its own to write a duplicate report for integrity checks:
+
+    python src/duplicates.py --near --output data/duplicates.csv
+"""
+import argparse
+import csv
+import hashlib
+import random
+import re
+import unicodedata
+from collections import namedtuple
+
+import learner_records
+
+# Words per shingle for near-duplicate detection
+SHINGLE_WORDS = 3
+# MinHash signature length, split into LSH bands of NUM_HASHES // BANDS hashes
+NUM_HASHES = 64
+BANDS = 16
+# Minimum shingle Jaccard similarity of near-duplicates
+NEAR_THRESHOLD = 0.8
+
+# Report columns written by write_report()
+REPORT_COLUMNS = ("AssignmentID", "Group", "Row", "Representative", "Match", "Similarity", "Words", "Preview")
+
+DuplicateGroup = namedtuple("DuplicateGroup", ["assignment_id", "representative", "rows", "matches", "similarities"])
+
+# Mersenne prime modulus and seeded coefficients of the MinHash permutations, fixed so signatures are reproducible
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+
+def normalize(summary) -> str:
+    """Normalized summary text: Unicode-normalized, lowercased, without punctuation and with single spaces."""
+    text = unicodedata.normalize("NFKC", str(summary if summary is not None else "")).lower()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> frozenset:
+    """Word shingles (runs of size consecutive words) of a normalized text; short texts give one shingle."""
+    words = text.split()
+    if len(words) <= size:
+        return frozenset([text])
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def minhash(shingle_set: frozenset) -> tuple:
+    """MinHash signature (NUM_HASHES values) of a shingle set."""
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), "big")
+              for shingle in shingle_set]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two sets."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _near_pairs(texts: list, threshold: float):
+    # Candidate pairs share all hashes of at least one LSH band; only those are compared exactly
+    rows_per_band = NUM_HASHES // BANDS
+    sets = [shingles(text) for text in texts]
+    buckets = {}
+    for index, shingle_set in enumerate(sets):
+        signature = minhash(shingle_set)
+        for band in range(BANDS):
+            key = (band, signature[band * rows_per_band:(band + 1) * rows_per_band])
+            buckets.setdefault(key, []).append(index)
+    seen = set()
+    for members in buckets.values():
+        for position, i in enumerate(members):
+            for j in members[position + 1:]:
+                if (i, j) not in seen:
+                    seen.add((i, j))
+                    if jaccard(sets[i], sets[j]) >= threshold:
+                        yield i, j
+
+
+def find_groups(records, near: bool = False, threshold: float = NEAR_THRESHOLD) -> list:
+    """
+    Groups duplicate learner summaries within each AssignmentID.
+
+    Args:
+        records: Learner records (e.g. from learner_records.iter_records).
+        near (bool): Also group near-duplicates, not only identical normalized summaries.
+        threshold (float): Minimum shingle Jaccard similarity of near-duplicates.
+
+    Returns:
+        list: One DuplicateGroup per group of two or more rows, in row order of the
+            representatives. The representative is the group's first row; matches and
+            similarities give, per row, "exact" or "near" and the similarity to the representative.
+    """
+    texts, assignment_ids = {}, {}
+    by_text = {}
+    for record in records:
+        text = normalize(record.summary)
+        texts[record.row] = text
+        assignment_ids[record.row] = record.assignment_id
+        by_text.setdefault((record.assignment_id, text), []).append(record.row)
+
+    # Union-find over the distinct normalized texts of each assignment
+    keys = list(by_text)
+    parent = list(range(len(keys)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if near:
+        by_assignment = {}
+        for index, (assignment_id, _) in enumerate(keys):
+            by_assignment.setdefault(assignment_id, []).append(index)
+        for indices in by_assignment.values():
+            for i, j in _near_pairs([keys[index][1] for index in indices], threshold):
+                parent[find(indices[i])] = find(indices[j])
+
+    clusters = {}
+    for index, key in enumerate(keys):
+        clusters.setdefault(find(index), []).extend(by_text[key])
+
+    groups = []
+    for rows in clusters.values():
+        if len(rows) < 2:
+            continue
+        rows = sorted(rows)
+        representative = rows[0]
+        base = texts[representative]
+        matches = tuple("exact" if texts[row] == base else "near" for row in rows)
+        similarities = tuple(1.0 if match == "exact" else round(jaccard(shingles(base), shingles(texts[row])), 3)
+                             for row, match in zip(rows, matches))
+        groups.append(DuplicateGroup(assignment_ids[representative], representative, tuple(rows), matches, similarities))
+    return sorted(groups, key=lambda group: group.representative)
+
+
+def duplicate_rows(groups: list) -> dict:
+    """Maps every non-representative row of the groups to the representative row it is graded through."""
+    return {row: group.representative for group in groups for row in group.rows if row != group.representative}
+
+
+def write_report(path: str, groups: list, records=None):
+    """
+    Writes one CSV line per row of every duplicate group.
+
+    Args:
+        path (str): CSV file to write.
+        groups (list): Output of find_groups().
+        records: Optional learner records to add word counts and a preview of each summary.
+    """
+    summaries = {}
+    if records is not None:
+        wanted = {row for group in groups for row in group.rows}
+        summaries = {record.row: normalize(record.summary) for record in records if record.row in wanted}
+    with open(path, "w", encoding='utf-8', newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        for number, group in enumerate(groups, 1):
+            for row, match, similarity in zip(group.rows, group.matches, group.similarities):
+                text = summaries.get(row, "")
+                writer.writerow({"AssignmentID": group.assignment_id, "Group": number, "Row": row,
+                                 "Representative": group.representative,
+                                 "Match": "representative" if row == group.representative else match,
+                                 "Similarity": similarity, "Words": len(text.split()) if row in summaries else "",
+                                 "Preview": text[:80]})
+
+
+def format_groups(groups: list) -> str:
+    """One-line summary of find_groups()."""
+    rows = sum(len(group.rows) - 1 for group in groups)
+    near = sum(1 for group in groups for match in group.matches if match == "near")
+    return "{} duplicate rows ({} near) in {} groups".format(rows, near, len(groups))
+
+
+if __name__ == "__main__":
+    import run_assessment
+
+    parser = argparse.ArgumentParser(description="Report duplicate learner summaries within each assignment.")
+    parser.add_argument("--input", default=run_assessment.INPUT_PATH)
+    parser.add_argument("--sheet", default=run_assessment.INPUT_SHEET)
+    parser.add_argument("--near", action="store_true", help="Also report near-duplicates (MinHash over word shingles).")
+    parser.add_argument("--threshold", type=float, default=NEAR_THRESHOLD,
+                        help="Minimum shingle Jaccard similarity of near-duplicates (default: %(default)s).")
+    parser.add_argument("--output", required=True, help="CSV file to write.")
+    args = parser.parse_args()
+
+    found = find_groups(learner_records.iter_records(args.input, args.sheet), args.near, args.threshold)
+    write_report(args.output, found, learner_records.iter_records(args.input, args.sheet))
+    print(format_groups(found))
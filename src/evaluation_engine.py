@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def iter_results(jobs, evaluate, max_concurrency):
+    """
+    Runs evaluate(job) for every job on a thread pool, keeping at most
+    max_concurrency calls in flight, and yields results as they complete.
+
+    Jobs are pulled from the iterable lazily, so a generator of jobs is never
+    materialized up front. With max_concurrency=1 the jobs run one after
+    another in their original order.
+
+    Args:
+        jobs (iterable): The jobs to evaluate, e.g. (row, criterion index) tuples.
+        evaluate (callable): Function called with a single job.
+        max_concurrency (int): Maximum number of evaluate calls in flight.
+
+    Yields:
+        tuple: (job, result) pairs in completion order.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1, got {}".format(max_concurrency))
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pending = {}
+        for job in jobs:
+            if len(pending) >= max_concurrency:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+            pending[executor.submit(evaluate, job)] = job
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
@@ -0,0 +1,122 @@
+import copy
+import json
+import re
+from typing import List
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+# Range of the rubric scores
+MIN_SCORE = 0
+MAX_SCORE = 5
+
+
+# Define desired data structure, shared by every prompt module.
+class Evaluation(BaseModel):
+    criterion: str = Field(description="The used evaluation criterion")
+    score: int = Field(ge=MIN_SCORE, le=MAX_SCORE, description="Integer score (0 to 5) of the text")
+    reasoning: str = Field(description="Detailed reasoning for the score")
+    strength: str = Field(description="Strength of the learner's summary")
+    improvement: str = Field(description="Actionable improvement suggestion")
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def _leading_integer(cls, value):
+        # Accept near misses such as "4", "4/5", "Score: 4" or 4.0 without another call
+        if isinstance(value, str):
+            match = re.search(r"-?\d+(\.\d+)?", value)
+            if match:
+                value = float(match.group(0))
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+
+class MultiEvaluation(BaseModel):
+    evaluations: List[Evaluation] = Field(description="One evaluation per criterion, in the order the criteria are given")
+
+
+def repair_json(text: str) -> str:
+    """
+    Cheap local fixes for almost-valid JSON responses.
+
+    Drops Markdown code fences and any prose around the outermost object,
+    straightens typographic quotes and removes trailing commas.
+    """
+    text = re.sub(r"```(?:json)?", "", text)
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    text = text.replace("“", '"').replace("”", '"')
+    return re.sub(r",\s*([}\]])", r"\1", text)
+
+
+def load_json(text: str):
+    """
+    Parses a JSON response, repairing it locally when it is almost valid.
+
+    Raises:
+        OutputParserException: If the response is not JSON even after repair.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair_json(text))
+    except ValueError as error:
+        raise OutputParserException("Invalid json output: {}".format(text), llm_output=text) from error
+
+
+def validate_evaluation(item) -> dict:
+    """
+    Validates one evaluation against the Evaluation schema.
+
+    Returns:
+        dict: The evaluation with an integer score in 0..5.
+
+    Raises:
+        OutputParserException: If the evaluation does not match the schema.
+    """
+    try:
+        return Evaluation.model_validate(item).model_dump()
+    except ValidationError as error:
+        raise OutputParserException("Evaluation does not match the schema: {}".format(error),
+                                    llm_output=json.dumps(item, default=str)) from error
+
+
+class EvaluationOutputParser(JsonOutputParser):
+    """JSON output parser that repairs almost-valid responses and validates them as an Evaluation."""
+
+    def parse(self, text: str) -> dict:
+        return validate_evaluation(load_json(text))
+
+
+def strict_schema(model) -> dict:
+    """JSON schema of a pydantic model in the strict form required by structured outputs."""
+    schema = copy.deepcopy(model.model_json_schema())
+
+    def close(node):
+        if isinstance(node, dict):
+            if node.get("type") == "object" and "properties" in node:
+                node["additionalProperties"] = False
+                node["required"] = list(node["properties"])
+            for value in node.values():
+                close(value)
+        elif isinstance(node, list):
+            for value in node:
+                close(value)
+
+    close(schema)
+    return schema
+
+
+def response_format(model) -> dict:
+    """Structured-output response_format that constrains the model's reply to the schema of model."""
+    return {"type": "json_schema",
+            "json_schema": {"name": model.__name__, "strict": True, "schema": strict_schema(model)}}
+
+
+EVALUATION_FORMAT = response_format(Evaluation)
+MULTI_EVALUATION_FORMAT = response_format(MultiEvaluation)
@@ -0,0 +1,516 @@
+"""
+Long-running grading service, so an LMS can submit summaries as learners hand them in.
+
+    python src/grading_service.py --port 8090 --strategy SR5 --rpm 500
+    curl -X POST 'http://127.0.0.1:8090/submissions?wait=60' \\
+         -d '{"id": "lms-123", "assignment_id": 85, "summary": "..."}'
+
+Endpoints:
+
+    POST /submissions        one submission object or a list of them: assignment_id, summary,
+                             optional id and optional criteria (default: all). Answers 202 with
+                             the queued submissions; with ?wait=SECONDS it waits for them to
+                             finish. A list is queued whole or, if any item is refused (400),
+                             not at all. Resubmitting an id returns the earlier submission, or
+                             409 when the summary or criteria differ.
+    GET  /submissions/<id>   status (queued, running, done or failed) and the results;
+                             ?wait=SECONDS waits for a queued or running submission.
+    GET  /stats              queue sizes, totals of all calls and latency of the recent calls.
+
+The process stays up between submissions, so the assignment bundles, prompt
+templates, response cache and HTTP client are loaded once and stay warm.
+Submissions wait in one queue per assignment. The dispatcher takes the
+assignment whose oldest submission has waited longest, lets BATCH_WINDOW
+seconds pass to collect more submissions of it (up to MAX_BATCH), and sends the
+micro-batch criterion by criterion, so consecutive calls share the same prompt
+prefix (material, expert summary, criterion) and hit the provider's prompt
+cache. At most `concurrency` calls are in flight; --rpm/--tpm apply on top.
+
+Results are kept in memory for the last MAX_RETAINED finished submissions.
+After a restart, resubmitting a summary is answered from the response cache.
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import assignments
+import learner_records
+import llm_client
+import material_retrieval
+import prompt_layout
+import prompt_templates
+import response_cache
+import run_assessment
+import strategies
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Seconds the dispatcher waits for more submissions of an assignment before sending its micro-batch
+BATCH_WINDOW = 0.05
+# Most submissions sent as one micro-batch
+MAX_BATCH = 16
+# Most submissions waiting in the queues; further submissions are refused with 503
+MAX_QUEUED = 10000
+# Finished submissions kept for polling; the oldest are forgotten first
+MAX_RETAINED = 10000
+# Longest ?wait a request may ask for, in seconds
+MAX_WAIT = 300.0
+# Most recent call records kept for the latency figures of /stats; totals count every call
+RECENT_CALLS = 10000
+
+
+class SubmissionConflict(Exception):
+    """A submission id was sent again with a different summary or criteria."""
+
+
+class Submission:
+    """One learner summary submitted to the service and the results of its criteria."""
+
+    def __init__(self, submission_id: str, record, indices: tuple):
+        self.id = submission_id
+        self.record = record
+        self.indices = indices
+        self.status = "queued"
+        self.results = {}
+        self.errors = {}
+        self.submitted = time.monotonic()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_json(self) -> dict:
+        payload = {"id": self.id, "assignment_id": self.record.assignment_id, "status": self.status,
+                   "results": {run_assessment.criterions[i]: self.results[i] for i in self.indices if i in self.results}}
+        if self.errors:
+            payload["errors"] = {run_assessment.criterions[i]: error for i, error in self.errors.items()}
+        if self.finished is not None:
+            payload["seconds"] = round(self.finished - self.submitted, 3)
+        return payload
+
+
+def _submission_spec(item: dict) -> tuple:
+    # (id or None, assignment_id, summary, criterion indices) of a valid submission; ValueError otherwise
+    assignment_id = item.get("assignment_id")
+    try:
+        assignment_id = int(assignment_id)
+    except (TypeError, ValueError):
+        raise ValueError("assignment_id must be an integer, got {!r}".format(assignment_id)) from None
+    if assignment_id not in assignments.get_registry().ids():
+        raise ValueError("Unknown assignment_id {}".format(assignment_id))
+    summary = item.get("summary")
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("summary must be a non-empty string")
+    criteria = item.get("criteria")
+    if criteria is None:
+        indices = tuple(range(len(run_assessment.criterions)))
+    else:
+        if not isinstance(criteria, list) or not criteria or any(name not in run_assessment.criterions for name in criteria):
+            raise ValueError("criteria must be a non-empty list of {}".format(", ".join(run_assessment.criterions)))
+        indices = tuple(sorted({run_assessment.criterions.index(name) for name in criteria}))
+    submission_id = item.get("id")
+    return (str(submission_id) if submission_id is not None else None), assignment_id, summary, indices
+
+
+class GradingService:
+    """
+    Queues submissions per assignment and grades them in micro-batches on a shared thread pool.
+
+    Args:
+        strategy_name (str): Prompt strategy from strategies.py.
+        concurrency (int): Maximum number of evaluations in flight. main() also caps the model calls
+            in flight process-wide at this number (llm_client.configure_calls).
+        batch_window (float): Seconds to collect submissions of an assignment before sending them.
+        max_batch (int): Most submissions per micro-batch.
+        multi_criterion (bool): Score all requested criteria of a submission in one call (SR4 and SR5 only).
+
+    Raises:
+        ValueError: If multi_criterion is set for a strategy not in strategies.MULTI_CRITERION.
+    """
+
+    def __init__(self, strategy_name: str = run_assessment.STRATEGY, concurrency: int = run_assessment.MAX_CONCURRENCY,
+                 batch_window: float = BATCH_WINDOW, max_batch: int = MAX_BATCH, multi_criterion: bool = False):
+        self.strategy_name = strategy_name
+        self.strategy = strategies.load(strategy_name)
+        if multi_criterion and strategy_name not in strategies.MULTI_CRITERION:
+            raise ValueError("--multi-criterion sends the SR-style single-call prompt; use it with {}, not {}.".format(
+                " or ".join(strategies.MULTI_CRITERION), strategy_name))
+        self.multi_criterion = multi_criterion
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._submissions = {}
+        self._finished = deque()
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._slots = threading.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._counts = {"submitted": 0, "done": 0, "failed": 0, "batches": 0}
+        self._dispatcher = threading.Thread(target=self._dispatch, name="grading-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def warm_up(self):
+        """
+        Loads every assignment bundle and builds the prompts the dispatcher sends, so the first submissions do not pay for it.
+
+        That is one prompt per criterion, or one multi-criterion prompt, for every
+        prompt module the strategy uses (all stages of a cascade).
+        """
+        modules = self.strategy.stages() if hasattr(self.strategy, "stages") else [self.strategy]
+        all_indices = tuple(range(len(run_assessment.criterions)))
+        jobs = [all_indices] if self.multi_criterion else [(i,) for i in all_indices]
+        for assignment_id in assignments.get_registry().ids():
+            record = learner_records.LearnerRecord(0, assignment_id, "", {})
+            for module in modules:
+                for indices in jobs:
+                    run_assessment.build_job_prompt(module, (record, indices))
+
+    def submit(self, assignment_id, summary, submission_id=None, criteria=None) -> Submission:
+        """
+        Queues a summary for grading.
+
+        Args:
+            assignment_id: AssignmentID of a configured assignment.
+            summary (str): The learner summary.
+            submission_id (str): Caller's id of the submission; resubmitting an id with the same
+                summary and criteria returns the earlier submission.
+            criteria (list): Criteria to grade (default: all).
+
+        Raises:
+            ValueError: If the assignment, the summary or a criterion is not valid.
+            SubmissionConflict: If submission_id was already submitted with another summary or criteria.
+            OverflowError: If MAX_QUEUED submissions are already waiting.
+        """
+        return self.submit_many([{"assignment_id": assignment_id, "summary": summary, "id": submission_id,
+                                  "criteria": criteria}])[0]
+
+    def submit_many(self, items: list) -> list:
+        """
+        Queues several submissions (dicts with assignment_id, summary, id and criteria) at once.
+
+        Either every submission is accepted or, when one of them is refused, none
+        is queued, so a client can correct the list and send all of it again.
+
+        Returns:
+            list: One Submission per item, in the same order.
+
+        Raises:
+            ValueError, SubmissionConflict, OverflowError: As for submit(); the message names the item.
+        """
+        specs = []
+        for position, item in enumerate(items):
+            try:
+                specs.append(_submission_spec(item))
+            except ValueError as error:
+                raise ValueError("Submission {}: {}".format(position, error)) from None
+
+        with self._condition:
+            # Check every item before queuing any of them
+            claimed, new = {}, 0
+            for position, (submission_id, assignment_id, summary, indices) in enumerate(specs):
+                if submission_id is None:
+                    new += 1
+                    continue
+                earlier = self._submissions.get(submission_id)
+                key = claimed.get(submission_id, (earlier.record.assignment_id, earlier.record.summary, earlier.indices)
+                                  if earlier is not None else None)
+                if key is None:
+                    claimed[submission_id] = (assignment_id, summary, indices)
+                    new += 1
+                elif key != (assignment_id, summary, indices):
+                    raise SubmissionConflict("Submission {}: id {!r} was already submitted with another summary "
+                                             "or criteria".format(position, submission_id))
+            if new and self._queued + new > MAX_QUEUED:
+                raise OverflowError("Queue full: {} of {} places taken, {} more asked for".format(
+                    self._queued, MAX_QUEUED, new))
+
+            submissions = []
+            for submission_id, assignment_id, summary, indices in specs:
+                if submission_id is not None and submission_id in self._submissions:
+                    submissions.append(self._submissions[submission_id])
+                    continue
+                number = next(self._ids)
+                submission_id = submission_id if submission_id is not None else "sub-{}".format(number)
+                # The sequence number is the row of the submission in telemetry and prompts
+                record = learner_records.LearnerRecord(number, assignment_id, summary, {"id": submission_id})
+                submission = Submission(submission_id, record, indices)
+                self._submissions[submission_id] = submission
+                self._queues.setdefault(assignment_id, deque()).append(submission)
+                self._queued += 1
+                self._counts["submitted"] += 1
+                submissions.append(submission)
+            self._condition.notify_all()
+        return submissions
+
+    def get(self, submission_id: str):
+        """Returns the submission with this id, or None if it is unknown or no longer retained."""
+        with self._condition:
+            return self._submissions.get(submission_id)
+
+    def stats(self) -> dict:
+        """Queue sizes, submission counts, totals of all calls and latency figures of the recent calls."""
+        with self._condition:
+            payload = dict(self._counts, strategy=self.strategy_name, queued=self._queued,
+                           queues={str(assignment_id): len(queue) for assignment_id, queue in self._queues.items()})
+        payload["running"] = payload["submitted"] - payload["done"] - payload["failed"] - payload["queued"]
+        payload["calls"] = telemetry.totals()
+        payload["recent_calls"] = telemetry.summary()
+        if hasattr(self.strategy, "escalation_totals"):
+            payload["escalations"] = self.strategy.escalation_totals()
+        return payload
+
+    def close(self):
+        """Stops taking work from the queues and waits for the calls in flight."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queues and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            # The assignment whose oldest submission has waited longest goes first
+            assignment_id = min(self._queues, key=lambda key: self._queues[key][0].submitted)
+            queue = self._queues[assignment_id]
+            deadline = queue[0].submitted + self.batch_window
+            while len(queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch))]
+            if not queue:
+                del self._queues[assignment_id]
+            self._queued -= len(batch)
+            self._counts["batches"] += 1
+            for submission in batch:
+                submission.status = "running"
+            return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if self.multi_criterion:
+                jobs = [(submission, submission.indices) for submission in batch]
+            else:
+                # Criterion by criterion, so calls with the same prompt prefix follow each other
+                jobs = [(submission, (i,)) for i in range(len(run_assessment.criterions))
+                        for submission in batch if i in submission.indices]
+            for job in jobs:
+                self._slots.acquire()
+                self._executor.submit(self._run, *job)
+
+    def _run(self, submission, indices):
+        record = submission.record
+        try:
+            with telemetry.call_context(strategy=self.strategy_name, assignment=record.assignment_id, row=record.row,
+                                        criterion=", ".join(run_assessment.criterions[i] for i in indices)):
+                job_results = run_assessment.evaluate_job(self.strategy, (record, indices))
+            error = None
+        except Exception as exc:
+            logger.warning("Submission %s could not be evaluated: %s", submission.id, str(exc).splitlines()[0])
+            job_results, error = None, "{}: {}".format(type(exc).__name__, str(exc).splitlines()[0] if str(exc) else "")
+        finally:
+            self._slots.release()
+        with self._condition:
+            for position, i in enumerate(indices):
+                if job_results is None:
+                    submission.errors[i] = error
+                else:
+                    submission.results[i] = job_results[position]
+            if len(submission.results) + len(submission.errors) == len(submission.indices):
+                self._finish(submission)
+
+    def _finish(self, submission):
+        # Called with the condition held
+        submission.status = "failed" if submission.errors else "done"
+        submission.finished = time.monotonic()
+        self._counts[submission.status] += 1
+        self._finished.append(submission.id)
+        while len(self._finished) > MAX_RETAINED:
+            self._submissions.pop(self._finished.popleft(), None)
+        submission.done.set()
+
+
+def wait_for(submissions: list, seconds: float):
+    """Waits up to seconds (at most MAX_WAIT) for the submissions to finish."""
+    deadline = time.monotonic() + min(max(seconds, 0.0), MAX_WAIT)
+    for submission in submissions:
+        submission.done.wait(max(deadline - time.monotonic(), 0.0))
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # Set by serve()
+    service = None
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _wait_seconds(self, url):
+        try:
+            return float(parse_qs(url.query).get("wait", ["0"])[0])
+        except ValueError:
+            return 0.0
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/submissions":
+            return self._send_json({"error": "Not found"}, 404)
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+        except ValueError:
+            return self._send_json({"error": "Body is not valid JSON"}, 400)
+        items = payload if isinstance(payload, list) else [payload]
+        if not items or not all(isinstance(item, dict) for item in items):
+            return self._send_json({"error": "Expected a submission object or a list of them"}, 400)
+
+        # Nothing of a refused list is queued
+        try:
+            submissions = self.service.submit_many(items)
+        except SubmissionConflict as error:
+            return self._send_json({"error": str(error)}, 409)
+        except ValueError as error:
+            return self._send_json({"error": str(error)}, 400)
+        except OverflowError as error:
+            return self._send_json({"error": str(error)}, 503, {"Retry-After": "5"})
+
+        wait_for(submissions, self._wait_seconds(url))
+        finished = all(submission.done.is_set() for submission in submissions)
+        replies = [submission.to_json() for submission in submissions]
+        self._send_json(replies if isinstance(payload, list) else replies[0], 200 if finished else 202)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts == ["stats"]:
+            return self._send_json(self.service.stats())
+        if len(parts) == 2 and parts[0] == "submissions":
+            submission = self.service.get(parts[1])
+            if submission is None:
+                return self._send_json({"error": "Unknown submission {}".format(parts[1])}, 404)
+            wait_for([submission], self._wait_seconds(url))
+            return self._send_json(submission.to_json())
+        self._send_json({"error": "Not found"}, 404)
+
+    def log_message(self, format, *args):
+        logger.info(format, *args)
+
+
+def serve(service: GradingService, host: str = "127.0.0.1", port: int = 8090) -> ThreadingHTTPServer:
+    """Starts the HTTP front end of a grading service on a background thread and returns the server."""
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve learner summary grading over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--strategy", default=run_assessment.STRATEGY, choices=strategies.names(),
+                        help="Prompt strategy to grade with (default: %(default)s).")
+    parser.add_argument("--model", default=None,
+                        help="Override the strategy's model, e.g. gpt-4.1-mini.")
+    parser.add_argument("--multi-criterion", action="store_true",
+                        help="Score all criteria of a submission in one model call (SR4 and SR5 only).")
+    parser.add_argument("--concurrency", type=int, default=run_assessment.MAX_CONCURRENCY,
+                        help="Maximum number of model calls in flight (default: %(default)s).")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW, metavar="SECONDS",
+                        help="Time to collect submissions of an assignment into one micro-batch (default: %(default)s).")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                        help="Most submissions per micro-batch (default: %(default)s).")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="Client-side limit on requests per minute (default: unlimited).")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="Client-side limit on estimated tokens per minute (default: unlimited).")
+    parser.add_argument("--timeout", type=float, default=120.0,
+                        help="Per-call timeout in seconds.")
+    parser.add_argument("--assignments", default=assignments.DEFAULT_CONFIG_DIR,
+                        help="Directory of assignment configs by AssignmentID.")
+    parser.add_argument("--prompts", default=prompt_templates.DEFAULT_TEMPLATE_DIR, metavar="DIR",
+                        help="Directory of prompt template files; edited files are picked up while serving.")
+    parser.add_argument("--material-budget", type=int, default=None, metavar="TOKENS",
+                        help="Send only the most relevant passages of the learning material, up to this many tokens.")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None, metavar="TOKENS",
+                        help="Token budget per prompt, counted locally.")
+    parser.add_argument("--backend", default="openai", choices=["openai", "mock"],
+                        help="Model backend; 'mock' simulates the service offline (see mock_backend.py).")
+    parser.add_argument("--mock", action="append", default=[], metavar="SETTING=VALUE",
+                        help="Mock backend setting, e.g. latency_median=0.2 (repeatable).")
+    parser.add_argument("--telemetry", default=None, metavar="PATH",
+                        help="JSONL log of every model call (default: in memory only, see GET /stats).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the local response cache and call the model for every prompt.")
+    parser.add_argument("--cache-path", default=llm_client.DEFAULT_CACHE_PATH,
+                        help="Location of the SQLite response cache.")
+    parser.add_argument("--cache-max-mb", type=int, default=response_cache.DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Size bound of the response cache in MB.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Log every request, prompt sizes and token usage of every call.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(name)s %(message)s")
+    assignments.configure(args.assignments)
+    material_retrieval.configure(args.material_budget)
+    prompt_layout.configure(args.max_prompt_tokens)
+    try:
+        prompt_templates.configure(args.prompts)
+        llm_client.configure_backend(args.backend, **run_assessment.mock_settings(args.mock))
+    except ValueError as error:
+        raise SystemExit(str(error))
+    llm_client.configure_cache(enabled=not args.no_cache, path=args.cache_path,
+                               max_bytes=args.cache_max_mb * 1024 * 1024)
+    llm_client.configure_calls(requests_per_minute=args.rpm, tokens_per_minute=args.tpm, timeout=args.timeout,
+                               max_in_flight=args.concurrency)
+    # Only the recent call records stay in memory; the call log (if any) keeps all of them
+    telemetry.configure(args.telemetry, max_records=RECENT_CALLS)
+
+    try:
+        service = GradingService(args.strategy, args.concurrency, args.batch_window, args.max_batch, args.multi_criterion)
+    except ValueError as error:
+        raise SystemExit(str(error))
+    if args.model is not None:
+        service.strategy.MODEL = args.model
+    service.warm_up()
+    print("Warmed up {} assignments".format(len(assignments.get_registry().ids())))
+    server = serve(service, args.host, args.port)
+    print("Grading service ({}) listening on http://{}:{}".format(args.strategy, args.host, args.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Shutting down; finishing the calls in flight")
+    finally:
+        server.shutdown()
+        service.close()
+        print(telemetry.format_totals(telemetry.totals()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import csv
+import json
+import os
+from collections import namedtuple
+
+# One learner submission: its row position in the input, assignment, summary text and all input columns
+LearnerRecord = namedtuple("LearnerRecord", ["row", "assignment_id", "summary", "fields"])
+
+ASSIGNMENT_COLUMN = "AssignmentID"
+SUMMARY_COLUMN = "summary"
+# Rows per Parquet read batch
+PARQUET_BATCH_SIZE = 1024
+
+
+def _input_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    formats = {".xlsx": "xlsx", ".xlsm": "xlsx", ".csv": "csv", ".jsonl": "jsonl", ".parquet": "parquet"}
+    if extension not in formats:
+        raise ValueError("Unsupported input format {!r}; use .xlsx, .csv, .jsonl or .parquet".format(extension))
+    return formats[extension]
+
+
+def _iter_xlsx(path, sheet):
+    import openpyxl
+
+    # read_only streams the sheet XML instead of loading the whole workbook
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        values = worksheet.iter_rows(values_only=True)
+        header = list(next(values, ()))
+        # Drop trailing blank header cells (formatted but unused columns) and name inner ones like pandas does
+        while header and header[-1] is None:
+            header.pop()
+        header = [str(name) if name is not None else "Unnamed: {}".format(i) for i, name in enumerate(header)]
+        for row in values:
+            if all(value is None for value in row):
+                continue
+            yield dict(zip(header, row[:len(header)]))
+    finally:
+        workbook.close()
+
+
+def _iter_csv(path):
+    with open(path, "r", encoding='utf-8', newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def _iter_jsonl(path):
+    with open(path, "r", encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_parquet(path):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=PARQUET_BATCH_SIZE):
+        yield from batch.to_pylist()
+
+
+def _iter_fields(path, sheet=None):
+    input_format = _input_format(path)
+    if input_format == "xlsx":
+        return _iter_xlsx(path, sheet)
+    if input_format == "csv":
+        return _iter_csv(path)
+    if input_format == "jsonl":
+        return _iter_jsonl(path)
+    return _iter_parquet(path)
+
+
+def _assignment_id(value):
+    # CSV and JSONL hand back text; Excel may hand back floats such as 85.0
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return value
+
+
+def iter_records(path: str, sheet: str = None, rows=None):
+    """
+    Streams learner records from an .xlsx, .csv, .jsonl or .parquet file.
+
+    Only one record is held at a time, so memory stays flat however large the
+    input is and the first record is available as soon as the file is opened.
+
+    Args:
+        path (str): The input file.
+        sheet (str): Worksheet name for .xlsx inputs (default: the active sheet).
+        rows: Optional container of row positions to keep (anything supporting `in`).
+
+    Yields:
+        LearnerRecord: One record per data row, with its 0-based row position.
+    """
+    for row, fields in enumerate(_iter_fields(path, sheet)):
+        if rows is not None and row not in rows:
+            continue
+        summary = fields.get(SUMMARY_COLUMN)
+        yield LearnerRecord(row=row,
+                            assignment_id=_assignment_id(fields.get(ASSIGNMENT_COLUMN)),
+                            summary=summary if summary is not None else "",
+                            fields=fields)
+
+
+def count_records(path: str, sheet: str = None) -> int:
+    """Counts the data rows of an input file without keeping any of them."""
+    if _input_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(1 for _ in _iter_fields(path, sheet))
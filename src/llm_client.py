@@ -0,0 +1,334 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import rate_limiter
+import response_cache
+import telemetry
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  "data", "cache", "responses.sqlite")
+
+_cache_settings = {"enabled": True, "path": DEFAULT_CACHE_PATH, "max_bytes": response_cache.DEFAULT_MAX_BYTES}
+_cache = None
+_cache_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: request timeout, conflict, rate limit and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Rough completion size reserved against the tokens-per-minute limit for every call
+EXPECTED_OUTPUT_TOKENS = 400
+
+# Connection pool shared by every client, sized for the highest concurrency we run at
+MAX_CONNECTIONS = 64
+
+_clients = {}
+_http_client = None
+_clients_lock = threading.Lock()
+
+# "openai" for the real service, "mock" for the offline simulator in mock_backend.py
+_backend = {"name": "openai", "settings": {}}
+
+_call_settings = {"max_retries": 5, "base_delay": 1.0, "max_delay": 60.0, "timeout": 120.0,
+                  "structured_outputs": True, "parse_retries": 1}
+_limiter = rate_limiter.RateLimiter()
+# Bounds the model requests in flight across all threads (e.g. self-consistency samples inside a job), or None
+_in_flight = None
+
+
+def configure_cache(enabled: bool = True, path: str = DEFAULT_CACHE_PATH, max_bytes: int = response_cache.DEFAULT_MAX_BYTES):
+    """
+    Configures the persistent response cache shared by every prompt module.
+
+    Args:
+        enabled (bool): Set to False to bypass the cache and always call the model.
+        path (str): Location of the SQLite cache file.
+        max_bytes (int): Size bound for cached responses before LRU eviction.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+        _cache_settings.update(enabled=enabled, path=path, max_bytes=max_bytes)
+
+
+def get_cache():
+    """Returns the shared ResponseCache, opening it on first use, or None when caching is disabled."""
+    global _cache
+    if not _cache_settings["enabled"]:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = response_cache.ResponseCache(_cache_settings["path"], _cache_settings["max_bytes"])
+        return _cache
+
+
+def configure_backend(name: str = "openai", **settings):
+    """
+    Selects the model backend for every client created from now on.
+
+    Args:
+        name (str): "openai" for the real service, or "mock" for the offline simulator.
+        **settings: Simulation settings for the mock backend (see mock_backend.DEFAULT_SETTINGS).
+
+    Raises:
+        ValueError: For an unknown backend or mock setting.
+    """
+    if name not in ("openai", "mock"):
+        raise ValueError("Unknown backend {!r}; use 'openai' or 'mock'".format(name))
+    if name == "mock":
+        import mock_backend
+
+        unknown = set(settings) - set(mock_backend.DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError("Unknown mock settings: {}".format(", ".join(sorted(unknown))))
+    with _clients_lock:
+        _backend.update(name=name, settings=dict(settings))
+        _clients.clear()
+
+
+def get_chat(model: str, temperature: float = None, api_key: str = None):
+    """
+    Returns the shared chat client for a model and temperature, creating it on first use.
+
+    All clients share one pooled HTTP connection pool, so strategies that are
+    never used never build a client and those that are reuse warm connections.
+    With the mock backend the client is a mock_backend.MockChat instead.
+
+    Args:
+        model (str): The OpenAI model name.
+        temperature (float): Sampling temperature, or None for the model default.
+        api_key (str): OpenAI API key; empty or None falls back to the OPENAI_API_KEY environment variable.
+
+    Returns:
+        ChatOpenAI: The cached client.
+    """
+    global _http_client
+    key = (model, temperature, api_key or None)
+    with _clients_lock:
+        if key not in _clients and _backend["name"] == "mock":
+            import mock_backend
+
+            _clients[key] = mock_backend.MockChat(model, temperature, _backend["settings"])
+        if key not in _clients:
+            import httpx
+            from langchain_openai import ChatOpenAI
+
+            if _http_client is None:
+                _http_client = httpx.Client(limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                                                max_keepalive_connections=MAX_CONNECTIONS))
+            # Retries are handled by call_with_retries, so the client itself does not retry
+            kwargs = {"model": model, "http_client": _http_client, "max_retries": 0}
+            if temperature is not None:
+                kwargs["temperature"] = temperature
+            if api_key:
+                kwargs["openai_api_key"] = api_key
+            _clients[key] = ChatOpenAI(**kwargs)
+        return _clients[key]
+
+
+def configure_calls(requests_per_minute: float = None, tokens_per_minute: float = None, max_retries: int = 5,
+                    base_delay: float = 1.0, max_delay: float = 60.0, timeout: float = 120.0,
+                    structured_outputs: bool = True, parse_retries: int = 1, max_in_flight: int = None):
+    """
+    Configures rate limiting, concurrency, retries and timeouts for every model call in the process.
+
+    Args:
+        requests_per_minute (float): Client-side request limit, or None for no limit.
+        tokens_per_minute (float): Client-side limit on estimated tokens, or None for no limit.
+        max_retries (int): Retries of a call after a retryable error (429, timeout, 5xx).
+        base_delay (float): First backoff delay in seconds; doubles on each retry.
+        max_delay (float): Upper bound of a single backoff delay in seconds.
+        timeout (float): Per-call timeout in seconds, or None for the client default.
+        structured_outputs (bool): Send the response schema with each call so the provider
+            constrains the reply to it; turn off for endpoints without structured outputs.
+        parse_retries (int): Fresh calls made after a response that does not parse even after local repair.
+        max_in_flight (int): Most model requests waiting for a response at once, counted over all
+            threads, or None for no limit. Calls made inside a job (such as self-consistency samples)
+            count too, so this holds however many calls one evaluation makes.
+    """
+    global _limiter, _in_flight
+    _limiter = rate_limiter.RateLimiter(requests_per_minute, tokens_per_minute)
+    _in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+    _call_settings.update(max_retries=max_retries, base_delay=base_delay, max_delay=max_delay, timeout=timeout,
+                          structured_outputs=structured_outputs, parse_retries=parse_retries)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (about four characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits, timeouts, connection failures and transient server errors."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status in RETRYABLE_STATUS_CODES:
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, (openai.APITimeoutError, openai.APIConnectionError))
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    # Honour the server's Retry-After hint when there is one, else use full-jitter exponential backoff
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        retry_after = None
+    if retry_after is not None:
+        return min(retry_after, _call_settings["max_delay"])
+    return random.uniform(0, min(_call_settings["max_delay"], _call_settings["base_delay"] * 2 ** attempt))
+
+
+def call_with_retries(chat, formatted_prompt, estimated_tokens: int, response_format: dict = None, stats: dict = None):
+    """
+    Calls chat.invoke under the shared rate limiter, retrying retryable errors with backoff.
+
+    Args:
+        chat: The chat model client.
+        formatted_prompt (list): The messages to send.
+        estimated_tokens (int): Tokens charged against the tokens-per-minute limit.
+        response_format (dict): Optional structured-output format, sent when structured outputs are on.
+        stats (dict): Optional dict that receives queue_wait_s (waits for the rate limiter and for a
+            free in-flight slot) and retries, also when the call finally fails.
+
+    Returns:
+        The response message of the first successful attempt.
+    """
+    stats = {} if stats is None else stats
+    stats.update(queue_wait_s=0.0, retries=0)
+    kwargs = {"timeout": _call_settings["timeout"]} if _call_settings["timeout"] else {}
+    if response_format is not None and _call_settings["structured_outputs"]:
+        kwargs["response_format"] = response_format
+    attempt = 0
+    while True:
+        # A slot is held only while a request is out, not during the backoff sleep
+        slot = _in_flight
+        if slot is not None:
+            waiting = time.monotonic()
+            slot.acquire()
+            stats["queue_wait_s"] += time.monotonic() - waiting
+        try:
+            stats["queue_wait_s"] += _limiter.acquire(estimated_tokens)
+            return chat.invoke(formatted_prompt, **kwargs)
+        except Exception as error:
+            if attempt >= _call_settings["max_retries"] or not is_retryable(error):
+                raise
+            delay = _retry_delay(error, attempt)
+            logger.warning("Retrying %s call in %.1fs after %s (attempt %d of %d)",
+                           getattr(chat, "model_name", None), delay, type(error).__name__,
+                           attempt + 1, _call_settings["max_retries"])
+        finally:
+            if slot is not None:
+                slot.release()
+        time.sleep(delay)
+        attempt += 1
+        stats["retries"] = attempt
+
+def invoke(chat, prompt: str, parse=None, use_cache: bool = True, response_format: dict = None):
+    """
+    Sends a single user prompt to the chat model and returns the (parsed) response.
+
+    Responses are looked up in and stored to the persistent cache, keyed by the
+    prompt together with the model name and temperature of the client. When a
+    parse function is given, a response is only cached once it parses, so a
+    malformed answer is never replayed on the next run. A response that does
+    not parse is re-requested up to parse_retries times before the error is raised.
+    Every model call and cache hit is recorded in telemetry.
+
+    Args:
+        chat: The chat model client (e.g. ChatOpenAI).
+        prompt (str): The fully built prompt.
+        parse (callable): Optional parser applied to the response text, e.g. output_parser.parse.
+        use_cache (bool): Set to False to force a fresh call for this prompt.
+        response_format (dict): Optional structured-output format constraining the reply.
+
+    Returns:
+        The parsed response, or the raw response text when no parser is given.
+    """
+    parse = parse or (lambda content: content)
+    model = getattr(chat, "model_name", None)
+    cache = get_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        key = response_cache.make_key(prompt, model, getattr(chat, "temperature", None),
+                                      getattr(chat, "backend", "openai"))
+        started = time.monotonic()
+        cached = cache.get(key)
+        if cached is not None:
+            telemetry.record(model, time.monotonic() - started, cache_hit=True)
+            return parse(cached)
+
+    formatted_prompt = [ {"role": "user", "content": prompt} ]
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        stats = {}
+        try:
+            response = call_with_retries(chat, formatted_prompt, estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS,
+                                         response_format, stats)
+        except Exception as error:
+            telemetry.record(model, time.monotonic() - started, error=type(error).__name__, **stats)
+            raise
+        wall = time.monotonic() - started
+        usage = extract_usage(response)
+        _log_usage(model, usage)
+        try:
+            result = parse(response.content)
+            telemetry.record(model, wall, **stats, **usage)
+            break
+        except ValueError as error:
+            telemetry.record(model, wall, error="unparseable", **stats, **usage)
+            if attempt >= _call_settings["parse_retries"]:
+                raise
+            attempt += 1
+            logger.warning("Re-requesting %s response that did not parse (attempt %d of %d): %s",
+                           model, attempt, _call_settings["parse_retries"], str(error).splitlines()[0])
+    if cache is not None:
+        cache.put(key, response.content)
+    return result
+
+
+def extract_usage(response) -> dict:
+    """
+    Reads token usage from a chat response, including provider-side prompt cache hits.
+
+    Args:
+        response: The message returned by chat.invoke.
+
+    Returns:
+        dict: input_tokens, cached_input_tokens and output_tokens (0 when not reported).
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    cached_input_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+
+    if not usage:
+        # Fall back to the raw OpenAI usage block
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        input_tokens = token_usage.get("prompt_tokens", 0)
+        output_tokens = token_usage.get("completion_tokens", 0)
+        cached_input_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+
+    return {"input_tokens": input_tokens or 0,
+            "cached_input_tokens": cached_input_tokens or 0,
+            "output_tokens": output_tokens or 0}
+
+
+def _log_usage(model, usage):
+    # Totals are kept by telemetry; this is the per-call line of -v
+    logger.info("model=%s input_tokens=%d cached=%d uncached=%d output_tokens=%d",
+                model, usage["input_tokens"], usage["cached_input_tokens"],
+                usage["input_tokens"] - usage["cached_input_tokens"], usage["output_tokens"])
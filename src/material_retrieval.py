@@ -0,0 +1,142 @@
+import functools
+import math
+import re
+from collections import Counter
+
+import llm_client
+
+# Target size of one retrievable passage of the learning material
+CHUNK_TOKENS = 200
+# Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+# Marks the places where passages of the material were left out
+OMISSION = "[...]"
+
+STOPWORDS = frozenset("""a an and are as at be been but by can do does for from has have how if in into is it its
+may more most not of on or such than that the their them then there these they this those to was were what when
+which while who will with would""".split())
+
+_settings = {"token_budget": None}
+
+
+def configure(token_budget: int = None):
+    """
+    Sets the token budget for the learning material in every prompt.
+
+    Args:
+        token_budget (int): Estimated tokens of material to keep per prompt, or None to send the full material.
+    """
+    if token_budget is not None and token_budget < 1:
+        raise ValueError("token_budget must be positive, got {}".format(token_budget))
+    _settings["token_budget"] = token_budget
+
+
+def tokenize(text: str) -> list:
+    """Lowercased word terms of text, without stopwords and with a plural 's' stripped."""
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS) -> list:
+    """
+    Splits text into passages of about chunk_tokens, along paragraph (line) boundaries.
+
+    Paragraphs are never split, so a single long paragraph becomes one larger passage.
+    """
+    chunks, current, size = [], [], 0
+    for paragraph in text.splitlines():
+        if not paragraph.strip():
+            continue
+        tokens = llm_client.estimate_tokens(paragraph)
+        if current and size + tokens > chunk_tokens:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class MaterialIndex:
+    """BM25 index over the passages of one learning material."""
+
+    def __init__(self, text: str, chunk_tokens: int = CHUNK_TOKENS):
+        self.chunks = chunk_text(text, chunk_tokens)
+        self.sizes = [llm_client.estimate_tokens(chunk) for chunk in self.chunks]
+        self._term_counts = [Counter(tokenize(chunk)) for chunk in self.chunks]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = sum(self._lengths) / max(len(self.chunks), 1)
+        document_frequency = Counter(term for counts in self._term_counts for term in counts)
+        n = len(self.chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: str) -> list:
+        """BM25 score of every passage for the query, in passage order."""
+        query_terms = Counter(tokenize(query))
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            norm = K1 * (1 - B + B * length / self._average_length)
+            score = 0.0
+            for term, weight in query_terms.items():
+                frequency = counts.get(term)
+                if frequency:
+                    score += weight * self._idf[term] * frequency * (K1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+    def condense(self, query: str, token_budget: int) -> str:
+        """
+        Keeps the passages most relevant to the query that fit in token_budget.
+
+        Passages are picked by descending score and joined in their original
+        order, with OMISSION where material was left out.
+        """
+        if sum(self.sizes) <= token_budget:
+            return "\n".join(self.chunks)
+        scores = self.scores(query)
+        keep, used = set(), 0
+        for i in sorted(range(len(self.chunks)), key=lambda i: (-scores[i], i)):
+            if used + self.sizes[i] <= token_budget:
+                keep.add(i)
+                used += self.sizes[i]
+        parts = []
+        for i in range(len(self.chunks)):
+            if i in keep:
+                parts.append(self.chunks[i])
+            elif not parts or parts[-1] != OMISSION:
+                parts.append(OMISSION)
+        return "\n".join(parts)
+
+
+@functools.lru_cache(maxsize=32)
+def get_index(learning_material: str) -> MaterialIndex:
+    """Returns the index of a learning material, chunking and indexing it only once per run."""
+    return MaterialIndex(learning_material)
+
+
+def condense(learning_material: str, learner_summary: str, key_concepts: str) -> str:
+    """
+    Reduces the learning material to the passages most relevant to a learner summary and the key concepts.
+
+    Returns the material unchanged when no token budget is configured.
+
+    Args:
+        learning_material (str): The full learning material.
+        learner_summary (str): The learner's summary.
+        key_concepts (str): The assignment's key concepts, joined into one string.
+
+    Returns:
+        str: The condensed material, within the configured token budget.
+    """
+    token_budget = _settings["token_budget"]
+    if token_budget is None:
+        return learning_material
+    return get_index(learning_material).condense(learner_summary + "\n" + key_concepts, token_budget)
@@ -0,0 +1,140 @@
+"""
+Offline stand-in for the OpenAI chat models, for running and load-testing without an API key.
+
+Select it with `run_assessment.py --backend mock` (or llm_client.configure_backend("mock")).
+Every reply is a schema-valid evaluation derived from a hash of the prompt, and
+latency, rate limits (429), timeouts, malformed replies and token counts are
+simulated from a seeded random generator. The n-th call of a given prompt always
+behaves the same way, so a run is reproducible while retries still see fresh outcomes.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage
+
+import llm_client
+
+# Simulation settings; override any of them through llm_client.configure_backend("mock", ...)
+DEFAULT_SETTINGS = {
+    "seed": 0,
+    # Call latency: log-normal around the median (seconds) with the given sigma
+    "latency_median": 0.8,
+    "latency_sigma": 0.5,
+    # Share of calls that fail with a 429 rate limit or a timeout
+    "rate_limit_rate": 0.0,
+    "timeout_rate": 0.0,
+    # Retry-After (seconds) sent with simulated 429s
+    "retry_after": 0.05,
+    # Share of replies wrapped in a code fence with a trailing comma (repairable locally)
+    "malformed_rate": 0.0,
+    # Average completion size in tokens
+    "output_tokens": 180,
+    # Provider prompt caching works in blocks of this many tokens of a previously seen prefix
+    "cache_block_tokens": 128,
+}
+
+# Learner summaries come last in every prompt, so everything before this marker is the cacheable prefix
+PREFIX_MARKER = "Learner Summary:"
+
+# Prompts whose call count, and prefixes whose cache state, each client remembers; the least
+# recently used are forgotten first, so a long-running service does not grow without bound
+MAX_TRACKED_PROMPTS = 10000
+MAX_TRACKED_PREFIXES = 1000
+
+
+class MockRateLimitError(Exception):
+    """Simulated HTTP 429, shaped like an OpenAI error (status_code, response.headers)."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("Rate limit reached (simulated)")
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": str(retry_after)})
+
+
+def fake_completion(prompt: str) -> str:
+    """Returns a deterministic evaluation JSON for a prompt (one or several criteria)."""
+    score = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16) % 6
+
+    def evaluation(criterion):
+        return {"criterion": criterion, "score": score, "reasoning": "Stand-in reasoning.",
+                "strength": "Stand-in strength.", "improvement": "Stand-in improvement."}
+
+    multi = re.search(r"separately on each of these criteria: (.+?)\.\n", prompt)
+    if multi:
+        return json.dumps({"evaluations": [evaluation(c) for c in multi.group(1).split(", ")]})
+    single = re.search(r"ONLY on \*\*(.+?)\*\*|\*\*Criterion: (.+?)\*\*", prompt)
+    return json.dumps(evaluation((single.group(1) or single.group(2)) if single else ""))
+
+
+class MockChat:
+    """
+    Drop-in for ChatOpenAI.invoke that simulates the service instead of calling it.
+
+    Thread-safe. Each client keeps its own call counters and prompt-prefix
+    cache, like the provider's per-model prompt cache. Both are bounded LRUs
+    (MAX_TRACKED_PROMPTS, MAX_TRACKED_PREFIXES).
+    """
+
+    # Keeps simulated replies apart from real ones in the response cache
+    backend = "mock"
+
+    def __init__(self, model: str, temperature: float = None, settings: dict = None):
+        self.model_name = model
+        self.temperature = temperature
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self._attempts = OrderedDict()
+        self._prefixes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            attempt = self._attempts.pop(digest, 0)
+            self._attempts[digest] = attempt + 1
+            if len(self._attempts) > MAX_TRACKED_PROMPTS:
+                self._attempts.popitem(last=False)
+        return random.Random("{}:{}:{}:{}".format(self.settings["seed"], self.model_name, digest, attempt))
+
+    def _cached_tokens(self, prompt: str) -> int:
+        prefix = prompt.split(PREFIX_MARKER, 1)[0]
+        digest = hashlib.sha256(prefix.encode('utf-8')).digest()
+        with self._lock:
+            seen = self._prefixes.pop(digest, False)
+            self._prefixes[digest] = True
+            if len(self._prefixes) > MAX_TRACKED_PREFIXES:
+                self._prefixes.popitem(last=False)
+        block = self.settings["cache_block_tokens"]
+        return (llm_client.estimate_tokens(prefix) // block) * block if seen else 0
+
+    def invoke(self, messages, timeout: float = None, **kwargs) -> AIMessage:
+        prompt = messages[-1]["content"] if isinstance(messages, list) else str(messages)
+        settings = self.settings
+        rng = self._rng(prompt)
+
+        outcome = rng.random()
+        if outcome < settings["rate_limit_rate"]:
+            raise MockRateLimitError(settings["retry_after"])
+        latency = settings["latency_median"] * rng.lognormvariate(0, settings["latency_sigma"])
+        if outcome < settings["rate_limit_rate"] + settings["timeout_rate"] or (timeout and latency > timeout):
+            time.sleep(min(latency, timeout) if timeout else latency)
+            raise TimeoutError("Request timed out (simulated)")
+        time.sleep(latency)
+
+        content = fake_completion(prompt)
+        if rng.random() < settings["malformed_rate"]:
+            content = "```json\n" + content[:-1] + ",}\n```"
+        output_tokens = max(1, int(rng.gauss(settings["output_tokens"], settings["output_tokens"] / 5)))
+        input_tokens = llm_client.estimate_tokens(prompt)
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": self._cached_tokens(prompt)},
+        })
@@ -0,0 +1,92 @@
+from typing import List
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+import functools
+import evaluation_schema
+import llm_client
+import prompt_layout
+import prompt_templates
+import prompt_final_SR_5 as SR5
+from evaluation_schema import Evaluation, MultiEvaluation
+
+# Define output parser (used for its format instructions; responses go through parse_evaluations)
+@functools.lru_cache(maxsize=None)
+def get_output_parser():
+    return JsonOutputParser(pydantic_object=MultiEvaluation)
+
+@functools.lru_cache(maxsize=None)
+def get_format_instructions():
+    return get_output_parser().get_format_instructions()
+
+# Prompt text lives in data/prompts/multi_criterion.txt and is reloaded when the file changes
+TEMPLATE = "multi_criterion"
+
+@functools.lru_cache(maxsize=64)
+def _task(template, criteria, definitions, score_guides):
+    # Rendered once per template version and set of criteria
+    rubric = "\n".join(template.render("rubric_entry", criterion=criterion, definition=definition, score_guide=score_guide)
+                       for criterion, definition, score_guide in zip(criteria, definitions, score_guides))
+    return template.render("task", criteria=", ".join(criteria), rubric=rubric)
+
+def build_prompt(criteria, definitions, score_guides, learning_material, expert_summary, key_concepts, learner_summary):
+    template = prompt_templates.load(TEMPLATE)
+    task = _task(template, tuple(criteria), tuple(definitions), tuple(score_guides))
+    # The shared material block comes first so every call of an assignment shares the same prefix
+    return prompt_layout.build(template.text("header"), get_format_instructions(), expert_summary, key_concepts, task,
+                               learner_summary, learning_material)
+
+
+def parse_evaluations(content: str, criteria: list) -> List[Evaluation]:
+    """
+    Parses a multi-criterion response and validates it against the Evaluation schema.
+
+    Almost-valid JSON is repaired locally before giving up on the response.
+
+    Args:
+        content (str): The raw model response.
+        criteria (list): The criteria that were requested, in order.
+
+    Returns:
+        list: One Evaluation per requested criterion, in the order of criteria.
+
+    Raises:
+        ValueError: If the response is not a list of evaluations, misses a criterion or an entry
+            does not match the schema (OutputParserException is a ValueError).
+    """
+    parsed = evaluation_schema.load_json(content)
+    items = parsed.get("evaluations", []) if isinstance(parsed, dict) else parsed
+    if not isinstance(items, list):
+        raise OutputParserException("Expected a list of evaluations, got: {}".format(content), llm_output=content)
+
+    by_criterion = {}
+    for item in items:
+        evaluation = Evaluation(**evaluation_schema.validate_evaluation(item))
+        by_criterion[evaluation.criterion.strip().lower()] = evaluation
+
+    missing = [criterion for criterion in criteria if criterion.lower() not in by_criterion]
+    if missing:
+        raise ValueError("Response has no evaluation for: {}".format(", ".join(missing)))
+    return [by_criterion[criterion.lower()] for criterion in criteria]
+
+
+def evaluate_all_criteria(criteria: list, definitions: list, score_guides: list, learning_material: str, expert_summary: str, key_concepts: list, learner_summary: str, chat=None) -> List[Evaluation]:
+    """
+    Evaluates a learner's summary on every criterion with a single model call.
+
+    Args:
+        criteria (list): The evaluation criteria.
+        definitions (list): The definition of each criterion.
+        score_guides (list): The scoring rubric/guide of each criterion.
+        learning_material (str): The original learning material.
+        expert_summary (str): The instructor/expert summary.
+        key_concepts (list): Key concepts identified by the instructor.
+        learner_summary (str): The learner's summary to evaluate.
+        chat: The chat model client to use (default: the SR5 model).
+
+    Returns:
+        list: One Evaluation per criterion, in the order of criteria.
+    """
+    full_prompt = build_prompt(criteria, definitions, score_guides, learning_material, expert_summary, key_concepts, learner_summary)
+    return llm_client.invoke(chat or SR5.get_chat(), full_prompt, lambda content: parse_evaluations(content, criteria),
+                             response_format=evaluation_schema.MULTI_EVALUATION_FORMAT)
@@ -1,57 +1,56 @@
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from pydantic import BaseModel, Field
+import functools
+import evaluation_schema
+import llm_client
+import prompt_layout
+import prompt_templates
 
 OPENAI_API_KEY =""
 
-# Initialize OpenAI
-chat = ChatOpenAI(model="gpt-5", openai_api_key = OPENAI_API_KEY)
+# OpenAI model settings; the client is created on first use and shared through llm_client
+MODEL = "gpt-5"
+TEMPERATURE = None
 
+def get_chat():
+    return llm_client.get_chat(MODEL, TEMPERATURE, OPENAI_API_KEY)
 
-# Define desired data structure.
-class Evaluation(BaseModel):
-    criterion: str = Field(description="The used evaluation criterion")
-    score: str = Field(description="Numeric score (0 to 5) of the text")
-    reasoning: str = Field(description="Detailed reasoning for the score")
-    strength: str = Field(description="Strength of the learner's summary")
-    improvement: str = Field(description="Actionable improvement suggestion")    
 
-# Define output parser
-output_parser = JsonOutputParser(pydantic_object=Evaluation)
-format_instructions = output_parser.get_format_instructions()
-# print(format_instructions)
+# Desired data structure (integer score 0-5), shared with the other prompt modules
+Evaluation = evaluation_schema.Evaluation
 
-# Prompt
-def build_prompt(criterion, definition, score_guide, learning_material, expert_summary, key_concepts, learner_summary):
-    return f"""
-You are evaluating a learner's summary based ONLY on **{criterion}**.
+# Define output parser
+@functools.lru_cache(maxsize=None)
+def get_output_parser():
+    return evaluation_schema.EvaluationOutputParser(pydantic_object=Evaluation)
 
-Definition:
-{definition}
+@functools.lru_cache(maxsize=None)
+def get_format_instructions():
+    return get_output_parser().get_format_instructions()
 
-Score Guide:
-{score_guide}
+def __getattr__(name):
+    # Keep chat, output_parser and format_instructions available as lazy module attributes
+    lazy = {"chat": get_chat, "output_parser": get_output_parser, "format_instructions": get_format_instructions}
+    if name in lazy:
+        return lazy[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-Output ONLY JSON in this format:
+# print(format_instructions)
 
-{{
-  "criterion": "{criterion}",
-  "score": <integer 0-5>,
-  "reasoning": "Brief statement of why the score was assigned (1 sentence).",
-  "strength": "<strengths>",
-  "improvement": "<actionable improvement suggestion>"
-}}
+# Prompt text lives in data/prompts/nCoT5.txt and is reloaded when the file changes
+TEMPLATE = "nCoT5"
 
-Inputs:
-- Full Material: {learning_material}
-- Expert Summary: {expert_summary}
-- Key Concepts: {", ".join(key_concepts)}
-- Learner Summary: {learner_summary}
+@functools.lru_cache(maxsize=64)
+def _task(template, criterion, definition, score_guide):
+    # Rendered once per template version and criterion
+    return template.render("task", criterion=criterion, definition=definition, score_guide=score_guide)
 
-{format_instructions}
+def build_prompt(criterion, definition, score_guide, learning_material, expert_summary, key_concepts, learner_summary):
+    template = prompt_templates.load(TEMPLATE)
+    task = _task(template, criterion, definition, score_guide)
+    # The shared material block comes first so every call of an assignment shares the same prefix
+    return prompt_layout.build(template.text("header"), get_format_instructions(), expert_summary, key_concepts, task,
+                               learner_summary, learning_material)
 
-"""
 def evaluate_text(criterion: str, definition: str, score_guide: str, learning_material: str, expert_summary: str, key_concepts: list, learner_summary: str) -> dict:
     """
     Evaluates a learner's summary based on the given criterion.
@@ -69,9 +68,8 @@ def evaluate_text(criterion: str, definition: str, score_guide: str, learning_ma
         dict: A dictionary with keys: criterion, score, reasoning, strength, improvement.
     """
     full_prompt = build_prompt(criterion, definition, score_guide, learning_material, expert_summary, key_concepts, learner_summary)
-    formatted_prompt = [ {"role": "user", "content": full_prompt} ]
-    response = chat.invoke(formatted_prompt)
-    return output_parser.parse(response.content)
+    return llm_client.invoke(get_chat(), full_prompt, get_output_parser().parse,
+                             response_format=evaluation_schema.EVALUATION_FORMAT)
 
 # Role and Objective
 # Instructions
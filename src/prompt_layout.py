@@ -0,0 +1,212 @@
+# Prompt assembly shared by the prompt modules.
+#
+# Providers cache the longest previously seen prompt prefix, so every prompt is laid
+# out as a stable prefix (instructions, learning material, expert summary, key concepts
+# and output format) that is byte-identical for all calls of an assignment, followed
+# by the parts that change per call (criterion, rubric, learner summary).
+#
+# With a prompt token budget (configure()), build() counts the tokens of a prompt
+# locally and trims its optional sections in TRIM_ORDER until it fits.
+
+import functools
+import logging
+
+import llm_client
+import material_retrieval
+
+# Optional sections, trimmed in this order when a prompt is over the token budget:
+# task parts named "example", "validation" or "reasoning_steps" are dropped, the
+# learning material is reduced to its passages most relevant to the learner summary,
+# and as a last resort the learner summary itself is truncated
+TRIM_ORDER = ("example", "validation", "reasoning_steps", "learning_material", "learner_summary")
+# Appended where a section was cut short
+TRUNCATION_MARK = " [...]"
+
+_settings = {"max_tokens": None}
+_encoding = {}
+
+logger = logging.getLogger(__name__)
+
+
+def configure(max_tokens: int = None):
+    """
+    Sets the token budget of every prompt built with build().
+
+    Args:
+        max_tokens (int): Most tokens a prompt may have, or None to never trim.
+    """
+    if max_tokens is not None and max_tokens < 1:
+        raise ValueError("max_tokens must be positive, got {}".format(max_tokens))
+    _settings["max_tokens"] = max_tokens
+
+
+def _get_encoding():
+    # tiktoken's o200k_base (gpt-4o/4.1/5) when it is installed and its vocabulary is available offline
+    if "encoding" not in _encoding:
+        try:
+            import tiktoken
+
+            _encoding["encoding"] = tiktoken.get_encoding("o200k_base")
+        except Exception as error:
+            logger.info("Counting prompt tokens by estimate, tiktoken is unavailable: %s", type(error).__name__)
+            _encoding["encoding"] = None
+    return _encoding["encoding"]
+
+
+@functools.lru_cache(maxsize=256)
+def count_tokens(text: str) -> int:
+    """Tokens of text, counted locally with tiktoken or estimated when it is not available."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return llm_client.estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cuts text to about max_tokens tokens, marking the cut with TRUNCATION_MARK."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Leave room for the mark itself
+    max_tokens = max(max_tokens - count_tokens(TRUNCATION_MARK), 0)
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4] + TRUNCATION_MARK
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]) + TRUNCATION_MARK
+
+
+def context_prefix(header: str, expert_summary: str, key_concepts, format_instructions: str, learning_material: str = None) -> str:
+    """
+    Builds the shared block that starts every prompt of an assignment.
+
+    The prefix is memoized, so the calls of an assignment reuse one string
+    instead of rebuilding the full material text every time.
+
+    Args:
+        header (str): Fixed role/task instructions of the prompt module.
+        expert_summary (str): The instructor/expert summary.
+        key_concepts (list or str): Key concepts identified by the instructor, or already joined with ", ".
+        format_instructions (str): The output parser's format instructions.
+        learning_material (str): The original learning material, or None to leave it out.
+
+    Returns:
+        str: The prefix text, identical for every criterion and learner of the assignment.
+    """
+    if not isinstance(key_concepts, str):
+        key_concepts = ", ".join(key_concepts)
+    return _context_prefix(header, expert_summary, key_concepts, format_instructions, learning_material)
+
+
+@functools.lru_cache(maxsize=64)
+def _context_prefix(header, expert_summary, key_concepts, format_instructions, learning_material):
+    material = f"- Full Material: {learning_material}\n" if learning_material is not None else ""
+    return f"""
+{header}
+
+Shared Inputs:
+{material}- Expert Summary: {expert_summary}
+- Key Concepts: {key_concepts}
+
+{format_instructions}
+"""
+
+
+def assemble(prefix: str, task: str, learner_summary: str) -> str:
+    """
+    Joins the shared prefix with the per-criterion task and the learner summary, in that order.
+
+    Args:
+        prefix (str): Output of context_prefix().
+        task (str): Criterion-specific instructions, rubric and output format.
+        learner_summary (str): The learner's summary to evaluate.
+
+    Returns:
+        str: The full prompt.
+    """
+    return _head(prefix, task) + learner_summary + "\n"
+
+
+@functools.lru_cache(maxsize=256)
+def _head(prefix, task):
+    # Everything before the learner summary, built once per (strategy, criterion, assignment)
+    return f"""{prefix}
+{task}
+
+Learner Summary:
+"""
+
+
+def build(header: str, format_instructions: str, expert_summary: str, key_concepts, task, learner_summary: str,
+          learning_material: str = None) -> str:
+    """
+    Lays out a full prompt (context_prefix() then assemble()) within the configured token budget.
+
+    Under the budget the prompt is exactly the assembled text. Over it, the
+    optional sections are trimmed in TRIM_ORDER until it fits. The token count of
+    every section is logged (at INFO level) so the size of prompts can be followed.
+
+    Args:
+        header (str): Fixed role/task instructions of the prompt module.
+        format_instructions (str): The output parser's format instructions.
+        expert_summary (str): The instructor/expert summary.
+        key_concepts (list or str): Key concepts identified by the instructor, or already joined with ", ".
+        task: Criterion-specific instructions as one string, or a list of (section name, text)
+            parts that are joined in order; parts named in TRIM_ORDER are optional.
+        learner_summary (str): The learner's summary to evaluate.
+        learning_material (str): The original learning material, or None to leave it out.
+
+    Returns:
+        str: The full prompt.
+
+    Raises:
+        ValueError: If the required sections alone are over the token budget.
+    """
+    if not isinstance(key_concepts, str):
+        key_concepts = ", ".join(key_concepts)
+    parts = [("task", task)] if isinstance(task, str) else list(task)
+
+    def render():
+        prefix = context_prefix(header, expert_summary, key_concepts, format_instructions, learning_material)
+        return assemble(prefix, "".join(text for _, text in parts), learner_summary)
+
+    prompt = render()
+    budget = _settings["max_tokens"]
+    if budget is None and not logger.isEnabledFor(logging.INFO):
+        return prompt
+
+    total = count_tokens(prompt)
+    if logger.isEnabledFor(logging.INFO):
+        sizes = [("header", header)] + ([("learning_material", learning_material)] if learning_material is not None else [])
+        sizes += [("expert_summary", expert_summary), ("key_concepts", key_concepts),
+                  ("format_instructions", format_instructions)] + parts + [("learner_summary", learner_summary)]
+        logger.info("prompt tokens=%d %s", total, " ".join("{}={}".format(name, count_tokens(text)) for name, text in sizes))
+    if budget is None or total <= budget:
+        return prompt
+
+    trimmed = []
+    for name in TRIM_ORDER:
+        # Shortened sections are counted by estimate, so retry a few times with the remaining excess
+        for _ in range(3):
+            if total <= budget:
+                break
+            excess = total - budget
+            if name == "learning_material" and learning_material:
+                target = count_tokens(learning_material) - excess
+                learning_material = (material_retrieval.get_index(learning_material).condense(
+                    learner_summary + "\n" + key_concepts, target) if target > 0 else material_retrieval.OMISSION)
+            elif name == "learner_summary":
+                learner_summary = truncate(learner_summary, count_tokens(learner_summary) - excess)
+            elif any(part_name == name for part_name, _ in parts):
+                parts = [(part_name, text) for part_name, text in parts if part_name != name]
+            else:
+                break
+            if name not in trimmed:
+                trimmed.append(name)
+            prompt = render()
+            total = count_tokens(prompt)
+    if total > budget:
+        raise ValueError("Prompt needs {} tokens even after trimming {}, over the budget of {}".format(
+            total, ", ".join(trimmed) or "nothing", budget))
+    # Cutting the graded text itself can change the score, so that is worth a warning
+    log = logger.warning if "learner_summary" in trimmed else logger.info
+    log("Trimmed %s to fit the prompt into %d tokens (now %d)", ", ".join(trimmed), budget, total)
+    return prompt
@@ -0,0 +1,149 @@
+"""
+Prompt templates loaded from text files, so prompts can be changed without code edits.
+
+Each prompt module has one template file in the template directory (default
+data/prompts/<name>.txt). A file is a list of named sections:
+
+    [[header]]
+    You are evaluating ...
+    [[task]]
+    You are evaluating a learner's summary based ONLY on **$criterion**.
+
+A section runs from the line after its [[name]] line up to the line before the
+next one; lines before the first section are comments. Placeholders use
+string.Template syntax ($name or ${name}; write $$ for a literal $). Templates
+are parsed and compiled once, and a file that changes on disk is reloaded on the
+next use (checked at most every RELOAD_INTERVAL seconds).
+"""
+import os
+import re
+import string
+import threading
+import time
+
+DEFAULT_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "prompts")
+
+# Seconds between checks of a template file for changes
+RELOAD_INTERVAL = 1.0
+
+SECTION_LINE = re.compile(r"^\[\[(.+?)\]\][ \t]*\n", re.MULTILINE)
+
+_settings = {"dir": DEFAULT_TEMPLATE_DIR}
+_templates = {}
+_lock = threading.Lock()
+
+
+def configure(template_dir: str = DEFAULT_TEMPLATE_DIR):
+    """
+    Sets the directory the prompt templates are loaded from, e.g. a directory of prompt variants.
+
+    Args:
+        template_dir (str): Directory holding one <name>.txt template file per prompt module.
+
+    Raises:
+        ValueError: If the directory does not exist.
+    """
+    if not os.path.isdir(template_dir):
+        raise ValueError("Prompt template directory {} does not exist".format(template_dir))
+    with _lock:
+        _settings["dir"] = template_dir
+        _templates.clear()
+
+
+def parse(text: str) -> dict:
+    """
+    Splits the text of a template file into its sections.
+
+    Returns:
+        dict: Section name -> section text, without the line break that precedes the next section line.
+
+    Raises:
+        ValueError: If a section name appears twice.
+    """
+    matches = list(SECTION_LINE.finditer(text))
+    sections = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        name = match.group(1).strip()
+        if name in sections:
+            raise ValueError("Section [[{}]] appears twice".format(name))
+        body = text[match.end():following.start() if following is not None else len(text)]
+        sections[name] = body[:-1] if body.endswith("\n") else body
+    return sections
+
+
+class PromptTemplate:
+    """The compiled sections of one template file."""
+
+    def __init__(self, path: str, text: str, mtime: int):
+        self.path = path
+        self.mtime = mtime
+        self.checked = time.monotonic()
+        self._sections = parse(text)
+        self._compiled = {name: string.Template(body) for name, body in self._sections.items()}
+
+    def has(self, section: str) -> bool:
+        """Whether the template defines section."""
+        return section in self._sections
+
+    def text(self, section: str) -> str:
+        """
+        Raw text of a section, without filling in placeholders.
+
+        Raises:
+            ValueError: If the template has no such section.
+        """
+        try:
+            return self._sections[section]
+        except KeyError:
+            raise ValueError("Prompt template {} has no [[{}]] section".format(self.path, section)) from None
+
+    def render(self, section: str, **values) -> str:
+        """
+        Fills the placeholders of a section.
+
+        Callers memoize the result (e.g. per criterion); a reloaded file is a new
+        PromptTemplate, so such caches never return text of an older version.
+
+        Raises:
+            ValueError: If the section is missing or uses a placeholder without a value.
+        """
+        self.text(section)
+        try:
+            return self._compiled[section].substitute(values)
+        except KeyError as error:
+            raise ValueError("Prompt template {} section [[{}]] has no value for ${}".format(
+                self.path, section, error.args[0])) from None
+
+
+def template_path(name: str) -> str:
+    """Path of the template file of a prompt module in the configured directory."""
+    return os.path.join(_settings["dir"], name + ".txt")
+
+
+def load(name: str) -> PromptTemplate:
+    """
+    Returns the compiled template of a prompt module, reloading it when its file has changed.
+
+    Args:
+        name (str): Template name, e.g. "SR5".
+
+    Raises:
+        ValueError: If the template file does not exist.
+    """
+    template = _templates.get(name)
+    now = time.monotonic()
+    if template is not None and now - template.checked < RELOAD_INTERVAL:
+        return template
+    with _lock:
+        template = _templates.get(name)
+        path = template_path(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise ValueError("No prompt template {!r} at {}".format(name, path)) from None
+        if template is None or template.mtime != mtime or template.path != path:
+            with open(path, encoding='utf-8') as f:
+                template = PromptTemplate(path, f.read(), mtime)
+            _templates[name] = template
+        template.checked = now
+        return template
@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills continuously at rate_per_minute.
+
+    acquire() blocks until the requested amount is available, so callers are
+    shaped to the configured rate instead of being rejected. The bucket starts
+    full, allowing a burst of up to capacity.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive, got {}".format(rate_per_minute))
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Takes amount tokens from the bucket, waiting until they are available.
+
+        Amounts larger than the bucket capacity are clamped to it, so an oversized
+        request waits for a full bucket instead of blocking forever.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter:
+    """
+    Client-side limiter on requests per minute and (estimated) tokens per minute.
+
+    Either limit can be None to leave it unbounded.
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens: int) -> float:
+        """
+        Blocks until one request carrying estimated_tokens fits under both limits.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += self.tokens.acquire(estimated_tokens)
+        return waited
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default upper bound on the total size of cached responses (in bytes of response text)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Eviction frees space down to this share of max_bytes, so a full cache does not evict on every put
+EVICT_TO = 0.9
+
+
+def make_key(prompt: str, model: str, temperature, backend: str = "openai") -> str:
+    """
+    Builds the content address of a call: a hash of the full prompt, model, temperature and backend.
+
+    Args:
+        prompt (str): The fully built prompt sent to the model.
+        model (str): The model name.
+        temperature: The sampling temperature, or None for the provider default.
+        backend (str): The backend answering the call; keys of the real service leave it out,
+            so existing cache entries stay valid.
+
+    Returns:
+        str: Hex SHA-256 digest identifying the call.
+    """
+    fields = [model, temperature, prompt] if backend == "openai" else [backend, model, temperature, prompt]
+    payload = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of model responses, keyed by make_key().
+
+    Entries are evicted least-recently-used first once the total size of the
+    stored responses exceeds max_bytes. The total is counted once when the
+    cache is opened and then kept up to date on every put; it is recounted
+    before evicting, since other processes may write to the same file. Safe to
+    share across threads, and across processes through SQLite's own locking.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self._total = self._stored_bytes()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str):
+        """Returns the cached response text for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, content: str):
+        """Stores a response and evicts the least recently used entries if the cache is over size."""
+        size = len(content.encode('utf-8'))
+        with self._lock:
+            replaced = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, size, time.time()),
+            )
+            self._total += size - (replaced[0] if replaced else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._stored_bytes()
+        if total > self.max_bytes:
+            stale = []
+            for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                stale.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self._total = total
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
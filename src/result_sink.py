@@ -0,0 +1,132 @@
+import json
+import os
+
+# Column holding the input row position, used to restore input order on export
+ROW_COLUMN = "row"
+# Learner rows buffered per Parquet row group
+ROW_GROUP_SIZE = 256
+
+
+class JsonlSink:
+    """
+    Appends one JSON object per graded learner to a JSONL file.
+
+    Every row is flushed as soon as it is written, so the file can be read
+    (or tailed) while the run is still going.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w", encoding='utf-8')
+
+    def write(self, row: dict):
+        self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    Writes graded learners to a Parquet file in row groups of row_group_size.
+
+    The schema is fixed by the first row group. Only typed_columns keep their
+    inferred types; every other (input) column is stored as text, because
+    spreadsheet columns often mix numbers and text (ClassID, numberofwords)
+    and a later row group could otherwise not match the schema.
+    """
+
+    def __init__(self, path: str, typed_columns=(), row_group_size: int = ROW_GROUP_SIZE):
+        self.path = path
+        self.typed_columns = set(typed_columns)
+        self.row_group_size = row_group_size
+        self._rows = []
+        self._writer = None
+
+    def write(self, row: dict):
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows as one row group."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        rows = [{key: self._cell(key, value) for key, value in row.items()} for row in self._rows]
+        if self._writer is None:
+            inferred = pa.Table.from_pylist(rows).schema
+            # Text columns, and columns that are still all empty, must accept text in later row groups
+            schema = pa.schema([field.with_type(pa.string())
+                                if field.name not in self.typed_columns or pa.types.is_null(field.type) else field
+                                for field in inferred])
+            table = pa.Table.from_pylist(rows, schema=schema)
+            self._writer = pq.ParquetWriter(self.path, schema)
+        else:
+            table = pa.Table.from_pylist(rows, schema=self._writer.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def _cell(self, key, value):
+        if key not in self.typed_columns and value is not None:
+            return str(value)
+        return value
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_sink(path: str, typed_columns=()):
+    """
+    Opens the result sink matching the extension of path (.parquet or .jsonl).
+
+    Args:
+        path (str): Output file; it is replaced if it exists.
+        typed_columns: Columns the Parquet sink keeps typed; the rest are stored as text.
+
+    Raises:
+        ValueError: For any other extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        return ParquetSink(path, typed_columns)
+    if extension == ".jsonl":
+        return JsonlSink(path)
+    raise ValueError("Unsupported output format {!r}; use .parquet or .jsonl".format(extension))
+
+
+def read_results(path: str):
+    """Reads a finished result file back into a DataFrame sorted by input row."""
+    import pandas as pd
+
+    if os.path.splitext(path)[1].lower() == ".parquet":
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+    if ROW_COLUMN in frame.columns:
+        frame = frame.sort_values(ROW_COLUMN, kind="stable").drop(columns=ROW_COLUMN)
+    return frame.reset_index(drop=True)
+
+
+def export_excel(path: str, excel_path: str):
+    """
+    Converts a finished result file to an Excel workbook in input row order.
+
+    Text columns that hold only numbers are turned back into numbers, so the
+    workbook looks like the input sheet.
+    """
+    import pandas as pd
+
+    frame = read_results(path)
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            try:
+                frame[column] = pd.to_numeric(frame[column])
+            except (TypeError, ValueError):
+                pass
+    frame.to_excel(excel_path, index=False)
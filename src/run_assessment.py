@@ -1,11 +1,27 @@
-import prompt_final_CoT_4_1 as CoT4
-import prompt_final_CoT_5 as CoT5
-import prompt_final_nonCoT_4_1 as nCoT4
-import prompt_final_nonCoT_5 as nCoT5
-import prompt_final_SR_4_1 as SR4
-import prompt_final_SR_5 as SR5
+import strategies
+import assignments
+import material_retrieval
+import prompt_layout
+import prompt_templates
+import concept_coverage
+import duplicates
+import evaluation_schema
+import multi_criterion
+import evaluation_engine
+import checkpoint
+import sharding
+import batch_mode
+import batch_stand_in
+import learner_records
+import result_sink
+import llm_client
+import response_cache
+import telemetry
+import argparse
+import logging
 import os
-import pandas as pd
+import random
+import sys
 
 
 criterions = ["Content Quality", "Content Coverage", "Content Coherence", "Argument"]
@@ -43,112 +59,724 @@ score_guides = [
 5: Meets the criteria for previous level. In addition, the essay is generally well organized, includes a concluding statement. The writing is clear and logical, and irrelevances that would weaken the argument.
 """,]
 
-data = {
-    "ContentQuality": {"score": [], "reasoning": [], "strength": [], "improvement": []},
-    "ContentCoverage": {"score": [], "reasoning": [], "strength": [], "improvement": []},
-    "ContentCoherence": {"score": [], "reasoning": [], "strength": [], "improvement": []},
-    "Argument": {"score": [], "reasoning": [], "strength": [], "improvement": []}
-}
 mapping = {0: "ContentQuality", 1: "ContentCoverage", 2: "ContentCoherence", 3: "Argument"}
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
-os.chdir(parent_dir)
 
-f = open("data/Chapter10Evaluation.txt", "r", encoding='utf-8')
-lm_85 = f.read()
-f.close()
+# Each learner summary
+INPUT_PATH = os.path.join(parent_dir, "data/grades_with_summary.xlsx")
+INPUT_SHEET = 'WithSummary'
+# Default output, filled in with the strategy name; .parquet or .jsonl, converted to .xlsx with --excel
+OUTPUT_PATH = os.path.join(parent_dir, "data/{strategy}_2.parquet")
 
-f = open("data/Chapter12Learning Analytics.txt", "r", encoding='utf-8')
-lm_106 = f.read()
-f.close()
+# Default prompt strategy from the registry in strategies.py (CoT4, CoT5, nCoT4, nCoT5, SR4, SR5, Cascade)
+STRATEGY = strategies.DEFAULT_STRATEGY
 
-expert85 = 'Evaluation is a fundamental component of the instructional design. Evaluation is the process of determining merit, worth, and value of things. The types of evaluation include confirmatory evaluation, formative evaluation, and summative evaluation. For example, formative evaluation supports the process of improvement, focusing on learner ability. Summative evaluation focuses on the overall effectiveness, usefulness, or worth of the instruction. This chapter introduces several evaluation models. Stufflebeam proposes the CIPP model that stands for context, input, process, and product evaluation. CIPP model influenced program planning, program structuring, implementation decisions. In the CIPP model, an evaluator often participates in a project as a member of the project team. From a broad perspective, Rossi views that evaluation can include needs assessment, theory assessment, implementation assessment, impact, and efficiency assessment. Chen proposes theory-driven evaluation in which evaluators and stakeholders work together. The important role of an evaluator is to help articulate, evaluate, and improve the program theory including an action model and change model. Kirkpatrick suggests that training evaluation should exam four levels of the outcomes including reaction, learning, behavior, and business results. Brinkerhoff emphasizes the use of success case to evaluate a program. He suggests that an organization can gain profits by applying knowledge learned from success cases. Lastly, Patton views that the use of evaluation findings is critical, and thus his evaluation model focuses on producing evaluation use. The utility of evaluation is judged by the degree of use. The use of evaluation findings can increase when stakeholders become active participants in the evaluation process.'
-expert106 = 'Learning analytics involves collecting and exploring data sets to search for meaningful patterns. Data is collected and analyzed to support various decision-making across educational institutions. The goal of learning analytics is to improve the learning experience. To this end, learning analytics use tools for extracting, tracking, and analyzing learner behaviors and performance. The outcomes include descriptive analytics that describes the state of learning, diagnostic analytics that attempts to understand why things happened, predictive analytics that attempts to describe what will happen next, and prescriptive analytics that suggest solutions to specific issues. The data used for learning analytics may come from national databases, institutional data, learning systems, and instructors. The results of learning analytics can be used for dashboards, institutional tools, and database tools to improve learning performance. For example, the outcomes of learning analytics can drive formative feedback for student success and recommendations for design improvement. There are sociocultural issues and legal issues around the use of these tools, such as protection of personal data.'
+# Maximum number of (learner, criterion) evaluations in flight at once; 1 runs sequentially
+MAX_CONCURRENCY = 8
 
-keyConcepts85 = ["process", "training evaluation", "use", "evalutation model", "cipp model", "stakeholder", "success case", "evaluation finding", "evaluation", "summative evaluation", "theory-driven evaluation", "formative evaluation", "evaluator"]
-keyConcepts106 = ["datum", "various decision-making", "descriptive anlaytic", "recommendation", "sociocultural issue", "design improvement", "pedictive analytic", "tool", "performance", "learning analytic", "learner behavior", "analytic", "outcome"]
 
-# Each learner summary
+def job_inputs(job):
+    """
+    Builds the keyword arguments of the evaluate/build_prompt call for a job.
+
+    A job is (learner record, criterion indices). A job with a single criterion
+    index maps to evaluate_text of the strategy; a job with several indices maps
+    to a single multi-criterion call.
+    """
+    record, indices = job
+    # Material, expert summary and key concepts of the learner's assignment, built once per run
+    bundle = assignments.get_bundle(record.assignment_id)
+
+    # With a material token budget, only the passages most relevant to this learner are sent
+    learning_material = material_retrieval.condense(bundle.learning_material, record.summary, bundle.key_concepts_text)
+
+    inputs = {"learning_material": learning_material, 
+              "expert_summary": bundle.expert_summary, 
+              "key_concepts": bundle.key_concepts_text, 
+              "learner_summary": record.summary}
+    if len(indices) > 1:
+        inputs.update(criteria = [criterions[i] for i in indices], 
+                      definitions = [definitions[i] for i in indices], 
+                      score_guides = [score_guides[i] for i in indices])
+    else:
+        i = indices[0]
+        inputs.update(criterion = criterions[i], 
+                      definition = definitions[i], 
+                      score_guide = score_guides[i])
+    return inputs
+
+
+def evaluate_job(strategy, job):
+    """
+    Evaluates one learner row on the criteria listed in the job.
+
+    Returns:
+        list: One result dict per criterion index in the job, in the same order.
+    """
+    inputs = job_inputs(job)
+    if len(job[1]) > 1:
+        evaluations = multi_criterion.evaluate_all_criteria(chat = strategy.get_chat(), **inputs)
+        return [evaluation.model_dump() for evaluation in evaluations]
+    return [strategy.evaluate_text(**inputs)]
+
+
+def build_job_prompt(strategy, job):
+    """Builds the prompt evaluate_job would send for a job, without calling the model."""
+    inputs = job_inputs(job)
+    if len(job[1]) > 1:
+        return multi_criterion.build_prompt(**inputs)
+    return strategy.build_prompt(**inputs)
+
+
+def job_response_format(job, args):
+    """Structured-output format of a job's reply, or None when structured outputs are off."""
+    if args.no_structured_outputs:
+        return None
+    return evaluation_schema.MULTI_EVALUATION_FORMAT if len(job[1]) > 1 else evaluation_schema.EVALUATION_FORMAT
 
-df = pd.read_excel('./data/grades_with_summary.xlsx', sheet_name='WithSummary')
-
-
-### import prompt_final_CoT_4_1 as CoT4
-### import prompt_final_CoT_5mini as CoT5
-### import prompt_final_nonCoT_4_1 as nCoT4
-## import prompt_final_nonCoT_5mini as nCoT5
-### import prompt_final_SR_4_1 as SR4
-# import prompt_final_SR_5mini as SR5
-
-for idx in range(len(df)):
-    learner_summary = df.iloc[idx]['summary']
-    assignmentID = df.iloc[idx]['AssignmentID']
-    # print(df.iloc[idx]['AssignmentID']==85)
-    # print(f"#{idx:3d}...", end="\t")
-    # For each criteria
-    for i in range (len(criterions)):
-        # print(f"{i:3d}...", end="\t")
-
-        if (df.iloc[idx]['AssignmentID'] == 85):
-            # print(85, end='\t')
-            result = SR5.evaluate_text(criterion = criterions[i], 
-                                    definition = definitions[i], 
-                                    score_guide = score_guides[i], 
-                                    learning_material = lm_85, 
-                                    expert_summary = expert85, 
-                                    key_concepts = keyConcepts85, 
-                                    learner_summary = learner_summary)
-        
-        else:
-            # print(106, end='\t')
-            result = SR5.evaluate_text(criterion = criterions[i], 
-                                    definition = definitions[i], 
-                                    score_guide = score_guides[i], 
-                                    learning_material = lm_106, 
-                                    expert_summary = expert106, 
-                                    key_concepts = keyConcepts106, 
-                                    learner_summary = learner_summary)
 
+def parse_job_response(strategy, indices, content):
+    """Parses a raw model response for a job into one result dict per criterion index."""
+    if len(indices) > 1:
+        evaluations = multi_criterion.parse_evaluations(content, [criterions[i] for i in indices])
+        return [evaluation.model_dump() for evaluation in evaluations]
+    return [strategy.get_output_parser().parse(content)]
+
+
+def result_columns(results, row):
+    """
+    Flattens the completed evaluations of one learner row into the result columns.
+
+    Args:
+        results (dict): Maps (row, criterion) to an evaluation result dict.
+        row (int): Row position of the learner in the input sheet.
+
+    Returns:
+        dict: Score, reasoning, strength and improvement per criterion, in column order.
+    """
+    columns = {}
+    for i in range(len(criterions)):
+        result = results[(row, criterions[i])]
         key = mapping.get(i, "Argument")
-        data[key]["score"].append(result["score"])
-        data[key]["reasoning"].append(result["reasoning"])
-        data[key]["strength"].append(result["strength"])
-        data[key]["improvement"].append(result["improvement"])
-        
-    if idx % 5 == 0:
-        print("Evaluating....{}".format(idx))
-        # print(f"CRITERION: {result['criterion']}")
-        # print(f"- Score: {result['score']}")
-        # print(f"- Reasoning: {result['reasoning']}")
-        # print(f"- Strength: {result['strength']}")
-        # print(f"- Improvement: {result['improvement']}")
-        # print("="*50)
-
-
-# Convert collected data into DataFrame columns
-results_df = pd.DataFrame({
-    "ContentQuality_Score": data["ContentQuality"]["score"],
-    "ContentQuality_Reasoning": data["ContentQuality"]["reasoning"],
-    "ContentQuality_Strength": data["ContentQuality"]["strength"],
-    "ContentQuality_Improvement": data["ContentQuality"]["improvement"],
-
-    "ContentCoverage_Score": data["ContentCoverage"]["score"],
-    "ContentCoverage_Reasoning": data["ContentCoverage"]["reasoning"],
-    "ContentCoverage_Strength": data["ContentCoverage"]["strength"],
-    "ContentCoverage_Improvement": data["ContentCoverage"]["improvement"],
-
-    "ContentCoherence_Score": data["ContentCoherence"]["score"],
-    "ContentCoherence_Reasoning": data["ContentCoherence"]["reasoning"],
-    "ContentCoherence_Strength": data["ContentCoherence"]["strength"],
-    "ContentCoherence_Improvement": data["ContentCoherence"]["improvement"],
-
-    "Argument_Score": data["Argument"]["score"],
-    "Argument_Reasoning": data["Argument"]["reasoning"],
-    "Argument_Strength": data["Argument"]["strength"],
-    "Argument_Improvement": data["Argument"]["improvement"]
-})
-
-# Merge new columns into original df
-final_df = pd.concat([df, results_df], axis=1)
-final_df.to_excel("data/SR5_2.xlsx", index=False)
+        columns[key + "_Score"] = result["score"]
+        columns[key + "_Reasoning"] = result["reasoning"]
+        columns[key + "_Strength"] = result["strength"]
+        columns[key + "_Improvement"] = result["improvement"]
+    return columns
+
+
+def result_column_names():
+    """Names of the result columns added by result_columns, in column order."""
+    return [mapping.get(i, "Argument") + suffix
+            for i in range(len(criterions))
+            for suffix in ("_Score", "_Reasoning", "_Strength", "_Improvement")]
+
+
+def output_row(record, results, coverage_features=False):
+    """
+    Joins the result columns onto the input columns of one fully graded learner.
+
+    Args:
+        coverage_features (bool): Also add the local key-concept coverage features.
+
+    Raises:
+        KeyError: If any criterion of the learner has not been evaluated yet.
+    """
+    row = dict({result_sink.ROW_COLUMN: record.row}, **record.fields, **result_columns(results, record.row))
+    if coverage_features:
+        row.update(concept_coverage.feature_columns(concept_coverage.record_coverage(record)))
+    return row
+
+
+def open_output(output_path):
+    """Opens the result sink for output_path, keeping the result and feature columns typed."""
+    return result_sink.open_sink(output_path, [result_sink.ROW_COLUMN] + result_column_names()
+                                 + list(concept_coverage.FEATURE_COLUMNS))
+
+
+def prescreen(records, results, journal):
+    """
+    Scores obviously empty or off-topic summaries 0 locally instead of sending them to the model.
+
+    Screened learners get a journaled result for every criterion, so make_jobs
+    creates no jobs for them. Every record is passed on unchanged.
+    """
+    for record in records:
+        reason = concept_coverage.screen(concept_coverage.record_coverage(record))
+        if reason:
+            for criterion in criterions:
+                if (record.row, criterion) not in results:
+                    result = {"criterion": criterion, "score": 0, "reasoning": reason, "strength": "",
+                              "improvement": "Write a summary of the learning material that covers its key concepts."}
+                    journal.record(record.row, criterion, result)
+                    results[(record.row, criterion)] = result
+        yield record
+
+
+def share_results(row, copy_rows, results, journal):
+    """
+    Copies the finished evaluations of a representative row to its duplicate rows, journaling every copy.
+
+    Returns:
+        bool: True when any evaluation was copied.
+    """
+    copied = False
+    for copy_row in copy_rows:
+        for criterion in criterions:
+            if (row, criterion) in results and (copy_row, criterion) not in results:
+                journal.record(copy_row, criterion, results[(row, criterion)])
+                results[(copy_row, criterion)] = results[(row, criterion)]
+                copied = True
+    return copied
+
+
+def reuse_duplicates(records, duplicate_of, results, journal):
+    """
+    Fills in duplicate rows from evaluations their representative already has (e.g. from --resume).
+
+    Every record is passed on unchanged.
+    """
+    for record in records:
+        if record.row in duplicate_of:
+            share_results(duplicate_of[record.row], [record.row], results, journal)
+        yield record
+
+
+def find_duplicates(args, rows, report_path):
+    """
+    Groups duplicate summaries of the selected rows within each assignment and writes the duplicate report.
+
+    Returns:
+        dict: Maps every duplicate row to the representative row it is graded through.
+    """
+    groups = duplicates.find_groups(learner_records.iter_records(args.input, args.sheet, rows),
+                                    near=args.dedupe == "near", threshold=args.duplicate_threshold)
+    duplicates.write_report(report_path, groups, learner_records.iter_records(args.input, args.sheet, rows))
+    print("Grading {} through their first row; report in {}".format(duplicates.format_groups(groups), report_path))
+    return duplicates.duplicate_rows(groups)
+
+
+def select_rows(n_rows, row_range=None, sample=None, seed=0):
+    """
+    Picks the row positions to grade.
+
+    Args:
+        n_rows (int): Number of rows in the input sheet.
+        row_range (str): Optional "START:END" slice of row positions (either side may be empty).
+        sample (int): Optional number of rows to draw at random from the selected range.
+        seed (int): Random seed for the sample, so a sample can be reproduced.
+
+    Returns:
+        list: Sorted row positions.
+    """
+    rows = list(range(n_rows))
+    if row_range:
+        start, _, end = row_range.partition(":")
+        rows = rows[int(start) if start else None:int(end) if end else None]
+    if sample is not None and sample < len(rows):
+        rows = sorted(random.Random(seed).sample(rows, sample))
+    return rows
+
+
+def row_selection(args):
+    """
+    Works out which row positions this process grades, without loading the input.
+
+    The input is only counted (one streaming pass) when a sample, a shard or a
+    negative --rows bound needs the total number of rows.
+
+    Returns:
+        A container of row positions supporting `in`, or None for every row.
+    """
+    start, end = None, None
+    if args.rows:
+        start, _, end = args.rows.partition(":")
+        start, end = int(start) if start else None, int(end) if end else None
+
+    if args.sample is None and not args.shard and (start or 0) >= 0 and (end is None or end >= 0):
+        if args.rows is None:
+            return None
+        return range(start or 0, end if end is not None else sys.maxsize)
+
+    rows = select_rows(learner_records.count_records(args.input, args.sheet), args.rows, args.sample, args.seed)
+    if args.shard:
+        # A shard worker grades its block of rows; its journal is the partial result read by --merge
+        rows = sharding.shard_rows(rows, *sharding.parse_shard(args.shard))
+    return set(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grade learner summaries with an LLM.")
+    parser.add_argument("--strategy", default=STRATEGY, choices=strategies.names(),
+                        help="Prompt strategy to grade with (default: %(default)s).")
+    parser.add_argument("--model", default=None,
+                        help="Override the strategy's model, e.g. gpt-4.1-mini.")
+    parser.add_argument("--temperature", type=float, default=None,
+                        help="Override the strategy's sampling temperature.")
+    parser.add_argument("--escalate-to", default=None, choices=[name for name in strategies.names() if name != "Cascade"],
+                        help="Cascade only: strategy that re-scores uncertain evaluations (default: SR5; CoT4 uses self-consistency).")
+    parser.add_argument("--max-spread", type=int, default=None,
+                        help="Cascade only: escalate when the cheap first-stage scores differ by more than this (default: 1).")
+    parser.add_argument("--borderline", default=None, metavar="SCORES",
+                        help="Cascade only: comma-separated rubric levels that always escalate, e.g. 2,3.")
+    parser.add_argument("--input", default=INPUT_PATH,
+                        help="Learner records (.xlsx, .csv, .jsonl or .parquet) with AssignmentID and summary columns.")
+    parser.add_argument("--sheet", default=INPUT_SHEET,
+                        help="Worksheet to read from an .xlsx input (default: %(default)s).")
+    parser.add_argument("--output", default=None,
+                        help="Result file, .parquet or .jsonl, written as learners finish, so in completion order "
+                             "(--excel and result_sink.read_results restore input order; default: data/<strategy>_2.parquet).")
+    parser.add_argument("--excel", action="store_true",
+                        help="Also convert the finished result file to an Excel workbook next to it (<output>.xlsx).")
+    parser.add_argument("--assignments", default=assignments.DEFAULT_CONFIG_DIR,
+                        help="Directory of assignment configs (material, expert summary, key concepts) by AssignmentID.")
+    parser.add_argument("--prompts", default=prompt_templates.DEFAULT_TEMPLATE_DIR, metavar="DIR",
+                        help="Directory of prompt template files, one <strategy>.txt per strategy (default: data/prompts/); "
+                             "edited files are picked up while a run is going.")
+    parser.add_argument("--material-budget", type=int, default=None, metavar="TOKENS",
+                        help="Send only the passages of the learning material most relevant to each summary "
+                             "and the key concepts, up to this many estimated tokens (default: full material).")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None, metavar="TOKENS",
+                        help="Token budget per prompt, counted locally; over it, examples, validation and reasoning "
+                             "steps are dropped, then the material and finally the learner summary are shortened.")
+    parser.add_argument("--prescreen", action="store_true",
+                        help="Score empty or off-topic summaries 0 locally (key-concept coverage) without calling the model.")
+    parser.add_argument("--dedupe", nargs="?", const="exact", default=None, choices=["exact", "near"],
+                        help="Grade duplicate summaries within an assignment once and copy the result to every copy: "
+                             "'exact' (default) after normalizing case, punctuation and spacing, or 'near' to also "
+                             "group near-duplicates. A duplicate report is written to <output>.duplicates.csv.")
+    parser.add_argument("--duplicate-threshold", type=float, default=duplicates.NEAR_THRESHOLD,
+                        help="Minimum word-shingle Jaccard similarity for --dedupe near (default: %(default)s).")
+    parser.add_argument("--coverage-features", action="store_true",
+                        help="Add local key-concept coverage columns to the output.")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="Maximum number of model calls in flight, including CoT4's self-consistency samples (default: %(default)s).")
+    parser.add_argument("--rows", default=None, metavar="START:END",
+                        help="Only grade this slice of row positions, e.g. 0:500.")
+    parser.add_argument("--sample", type=int, default=None,
+                        help="Only grade a random sample of this many rows (from --rows if given).")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed for --sample (default: %(default)s).")
+    parser.add_argument("--shard", default=None, metavar="K/N",
+                        help="Grade only shard K (0-based) of N and write its partial result for --merge.")
+    parser.add_argument("--merge", type=int, default=None, metavar="N",
+                        help="Reassemble the output from the partial results of N shards, in original row order.")
+    parser.add_argument("--workers", type=int, default=None, metavar="N",
+                        help="Run N local shard worker processes and merge their results (rate limits are split between them).")
+    parser.add_argument("--backend", default="openai", choices=["openai", "mock"],
+                        help="Model backend; 'mock' simulates the service offline (see mock_backend.py).")
+    parser.add_argument("--mock", action="append", default=[], metavar="SETTING=VALUE",
+                        help="Mock backend setting, e.g. latency_median=0.2 or rate_limit_rate=0.05 (repeatable).")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit all prompts as one provider Batch API job instead of real-time calls.")
+    parser.add_argument("--batch-base-url", default=None,
+                        help="API base URL for batch mode, e.g. a local stand-in server (see batch_stand_in.py).")
+    parser.add_argument("--batch-poll", type=float, default=30.0,
+                        help="Seconds between batch status checks (default: %(default)s).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip (row, criterion) pairs already in the journal and continue the run.")
+    parser.add_argument("--journal", default=None,
+                        help="Path of the append-only results journal (default: <output>.journal.jsonl).")
+    parser.add_argument("--multi-criterion", action="store_true",
+                        help="Score all criteria of a learner in one model call instead of one call per criterion "
+                             "(SR4 and SR5 only; uses the SR-style prompt in data/prompts/multi_criterion.txt).")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="Client-side limit on requests per minute (default: unlimited).")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="Client-side limit on estimated tokens per minute (default: unlimited).")
+    parser.add_argument("--max-retries", type=int, default=5,
+                        help="Retries per call after a rate limit, timeout or server error.")
+    parser.add_argument("--timeout", type=float, default=120.0,
+                        help="Per-call timeout in seconds.")
+    parser.add_argument("--no-structured-outputs", action="store_true",
+                        help="Do not send the response JSON schema (for endpoints without structured outputs).")
+    parser.add_argument("--parse-retries", type=int, default=1,
+                        help="Fresh calls after a response that does not parse even after local repair (default: %(default)s).")
+    parser.add_argument("--telemetry", default=None, metavar="PATH",
+                        help="JSONL log of every model call: latency, rate-limit wait, retries, tokens, cost, "
+                             "strategy and criterion (default: <output>.calls.jsonl).")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Log token usage (cached vs. uncached input tokens) for every call.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the local response cache and call the model for every prompt.")
+    parser.add_argument("--cache-path", default=llm_client.DEFAULT_CACHE_PATH,
+                        help="Location of the SQLite response cache.")
+    parser.add_argument("--cache-max-mb", type=int, default=response_cache.DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Size bound of the response cache in MB; least recently used entries are evicted first.")
+    args = parser.parse_args(argv)
+    if args.batch and (args.shard or args.workers):
+        parser.error("--batch submits one provider batch job and cannot be split with --shard or --workers")
+    return args
+
+
+def mock_settings(values):
+    """Parses repeated --mock SETTING=VALUE arguments into numeric mock backend settings."""
+    settings = {}
+    for value in values:
+        name, sep, number = value.partition("=")
+        if not sep:
+            raise SystemExit("--mock expects SETTING=VALUE, got {!r}".format(value))
+        settings[name.strip()] = float(number)
+    return settings
+
+
+def make_jobs(records, results, multi_criterion_mode=False, skip_rows=()):
+    """
+    Yields the (learner record, criterion indices) jobs still missing from results.
+
+    Records are consumed lazily, so grading starts with the first record read.
+    In multi-criterion mode one job scores every remaining criterion of a row in a single call.
+    Rows in skip_rows (duplicates graded through another row) get no jobs.
+    """
+    for record in records:
+        if record.row in skip_rows:
+            continue
+        remaining = tuple(i for i in range(len(criterions)) if (record.row, criterions[i]) not in results)
+        if multi_criterion_mode and remaining:
+            yield (record, remaining)
+        else:
+            for i in remaining:
+                yield (record, (i,))
+
+
+def grade(args, strategy, records, journal, sink=None, duplicate_of=None):
+    """
+    Grades the given learner records, journaling every completed evaluation.
+
+    Each learner is written to the result sink (if any) as soon as all of its
+    criteria are evaluated, so the output grows in completion order while the run
+    goes on. Rows in duplicate_of are not graded themselves; they get a copy of
+    every evaluation of their representative row as soon as it completes. The
+    evaluations of a finished learner are dropped from memory once its duplicates
+    have their copies; the journal keeps them all.
+
+    Returns:
+        tuple: (results, missing) where results maps (row, criterion) to the evaluations
+            of learners left incomplete and missing counts those learners.
+    """
+    # Reuse every evaluation that already finished in an earlier run
+    results = journal.load() if args.resume else {}
+    if results:
+        print("Resuming with {} completed evaluations from {}".format(len(results), journal.path))
+
+    # Learners read from the input that still wait for some of their evaluations
+    pending = {}
+
+    def finish(record):
+        # Raises KeyError while any criterion of the learner is still missing
+        if sink is not None:
+            sink.write(output_row(record, results, args.coverage_features))
+        else:
+            result_columns(results, record.row)
+
+    def release(row):
+        # A finished row is only still needed by its duplicates: hand them their copies, then forget it
+        share_results(row, copies.get(row, ()), results, journal)
+        for criterion in criterions:
+            results.pop((row, criterion), None)
+
+    def track(records):
+        for record in records:
+            try:
+                finish(record)
+                finished = True
+            except KeyError:
+                pending[record.row] = record
+                finished = False
+            yield record
+            # Only released once make_jobs has seen the row complete, or it would be graded again
+            if finished:
+                release(record.row)
+
+    def evaluate(job):
+        record, indices = job
+        try:
+            with telemetry.call_context(strategy=args.strategy, criterion=", ".join(criterions[i] for i in indices),
+                                        row=record.row):
+                return evaluate_job(strategy, job)
+        except ValueError as error:
+            # Still unparseable after local repair and a fresh call: leave it missing for --resume
+            print("Row {} could not be evaluated: {}".format(job[0].row, str(error).splitlines()[0]))
+            return None
+        except Exception as error:
+            if not llm_client.is_retryable(error):
+                raise
+            # Rate limit, timeout or server error that outlasted --max-retries: leave it missing for --resume
+            print("Row {} could not be evaluated after retries: {}".format(job[0].row, type(error).__name__))
+            return None
+
+    duplicate_of = duplicate_of or {}
+    copies = {}
+    for row, representative in duplicate_of.items():
+        copies.setdefault(representative, []).append(row)
+
+    if args.prescreen:
+        records = prescreen(records, results, journal)
+    if duplicate_of:
+        records = reuse_duplicates(records, duplicate_of, results, journal)
+    # Fan out every remaining (learner, criterion) pair and collect the results as they complete
+    jobs = make_jobs(track(records), results, args.multi_criterion, duplicate_of)
+    done = 0
+    try:
+        for (record, indices), job_results in evaluation_engine.iter_results(jobs, evaluate, args.concurrency):
+            if job_results is None:
+                continue
+            for i, result in zip(indices, job_results):
+                journal.record(record.row, criterions[i], result)
+                results[(record.row, criterions[i])] = result
+                done += 1
+                if done % (5 * len(criterions)) == 0:
+                    print("Evaluated {} ({})".format(done, telemetry.format_progress(telemetry.summary())))
+            share_results(record.row, copies.get(record.row, ()), results, journal)
+            for row in [record.row] + copies.get(record.row, []):
+                if row in pending:
+                    try:
+                        finish(pending[row])
+                    except KeyError:
+                        continue
+                    del pending[row]
+                    release(row)
+    finally:
+        journal.close()
+        if sink is not None:
+            sink.close()
+    return results, len(pending)
+
+
+def grade_batch(args, strategy, records, journal, output_path, duplicate_of=None):
+    """
+    Grades the given rows through the provider's Batch API instead of real-time calls.
+
+    Every remaining job becomes one request of a batch input file. The batch is
+    submitted, polled until it finishes, and each response is parsed and
+    journaled exactly like a real-time result. Requests that failed or did not
+    parse stay missing and can be filled in by a normal --resume run. Rows in
+    duplicate_of are not sent; they get a copy of their representative's evaluations.
+
+    Returns:
+        dict: Maps (row, criterion) to the evaluation result for all completed evaluations.
+    """
+    if hasattr(strategy, "evaluate_with_self_consistency") or getattr(strategy, "MULTI_STAGE", False):
+        raise SystemExit("Batch mode sends one prompt per evaluation; {} makes several dependent calls "
+                         "per evaluation and cannot be batched.".format(args.strategy))
+
+    results = journal.load() if args.resume else {}
+    base = os.path.splitext(output_path)[0]
+    state_path = base + ".batch.json"
+    base_url = args.batch_base_url
+    if base_url is None and args.backend == "mock":
+        # Exercise the batch path offline against an in-process stand-in of the Batch API
+        server = batch_stand_in.serve(port=0)
+        base_url = "http://127.0.0.1:{}/v1".format(server.server_address[1])
+    client = batch_mode.make_client(base_url)
+
+    duplicate_of = duplicate_of or {}
+    batch_id = batch_mode.load_state(state_path) if args.resume else None
+    if batch_id is None:
+        requests = []
+        if args.prescreen:
+            records = prescreen(records, results, journal)
+        if duplicate_of:
+            records = reuse_duplicates(records, duplicate_of, results, journal)
+        for job in make_jobs(records, results, args.multi_criterion, duplicate_of):
+            custom_id = "{}:{}".format(job[0].row, ",".join(str(i) for i in job[1]))
+            requests.append(batch_mode.build_request(custom_id, strategy.MODEL, strategy.TEMPERATURE,
+                                                     build_job_prompt(strategy, job), job_response_format(job, args)))
+        if not requests:
+            return results
+        batch_mode.write_batch_file(base + ".batch.jsonl", requests)
+        batch_id = batch_mode.submit(client, base + ".batch.jsonl", state_path)
+        print("Submitted batch {} with {} requests".format(batch_id, len(requests)))
+    else:
+        print("Resuming batch {}".format(batch_id))
+
+    batch = batch_mode.wait_for_batch(client, batch_id, args.batch_poll)
+    responses, errors = batch_mode.read_responses(client, batch)
+    try:
+        for custom_id, content in responses.items():
+            row, _, indices = custom_id.partition(":")
+            row, indices = int(row), tuple(int(i) for i in indices.split(","))
+            try:
+                job_results = parse_job_response(strategy, indices, content)
+            except Exception as error:
+                errors[custom_id] = str(error)
+                continue
+            for i, result in zip(indices, job_results):
+                journal.record(row, criterions[i], result)
+                results[(row, criterions[i])] = result
+        for row, representative in duplicate_of.items():
+            share_results(representative, [row], results, journal)
+    finally:
+        journal.close()
+    os.remove(state_path)
+
+    print("Batch {} {}: {} responses, {} failed".format(batch_id, batch.status, len(responses), len(errors)))
+    return results
+
+
+def write_output(records, results, sink, coverage_features=False):
+    """
+    Joins the result columns onto the graded input records and streams them to the sink.
+
+    Returns:
+        int: Number of learners left out because some of their evaluations are missing.
+    """
+    missing = 0
+    try:
+        for record in records:
+            try:
+                sink.write(output_row(record, results, coverage_features))
+            except KeyError:
+                missing += 1
+    finally:
+        sink.close()
+    return missing
+
+
+def finish_output(args, output_path, missing):
+    """Reports learners with missing evaluations, or converts the finished result file to Excel."""
+    if missing:
+        raise SystemExit("{} learners have missing evaluations; rerun with --resume to fill them in.".format(missing))
+    if args.excel:
+        excel_path = os.path.splitext(output_path)[0] + ".xlsx"
+        result_sink.export_excel(output_path, excel_path)
+        print("Wrote {}".format(excel_path))
+
+
+def run_file_path(journal_path, suffix):
+    """File written next to a journal, e.g. <output>.calls.jsonl, or <output>.shard-K-of-N.calls.jsonl for a shard."""
+    base = journal_path[:-len(".journal.jsonl")] if journal_path.endswith(".journal.jsonl") else os.path.splitext(journal_path)[0]
+    return base + suffix
+
+
+def call_log_path(args, journal_path, shard=None):
+    """
+    Call log of a run: --telemetry if given, else <output>.calls.jsonl next to the journal.
+
+    Args:
+        shard (tuple): (index, count) of a shard; a --telemetry path then gets a per-shard
+            name, so the workers of a run do not append to one file.
+    """
+    if args.telemetry is None:
+        return run_file_path(journal_path, ".calls.jsonl")
+    if shard is None:
+        return args.telemetry
+    return sharding.shard_file_path(args.telemetry, *shard)
+
+
+def print_telemetry(calls):
+    """Prints the latency, throughput and cost summary of the model calls, per model when several were used."""
+    if not calls:
+        return
+    print("Telemetry: " + telemetry.format_summary(telemetry.summary(calls)))
+    by_model = telemetry.summary_by("model", calls)
+    if len(by_model) > 1:
+        for model, totals in sorted(by_model.items(), key=lambda item: str(item[0])):
+            print("  {}: {}".format(model, telemetry.format_summary(totals)))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(name)s %(message)s")
+    output_path = args.output or OUTPUT_PATH.format(strategy=args.strategy)
+    try:
+        shard = sharding.parse_shard(args.shard) if args.shard else None
+    except ValueError as error:
+        raise SystemExit(str(error))
+    assignments.configure(args.assignments)
+    material_retrieval.configure(args.material_budget)
+    prompt_layout.configure(args.max_prompt_tokens)
+    try:
+        prompt_templates.configure(args.prompts)
+    except ValueError as error:
+        raise SystemExit(str(error))
+
+    if args.workers and not args.shard:
+        # Run one local worker process per shard, then merge their partial results
+        codes = sharding.launch_workers(os.path.abspath(__file__), argv, args.workers, args.rpm, args.tpm)
+        if any(codes):
+            raise SystemExit("{} of {} shard workers failed; rerun them with --resume.".format(
+                sum(1 for code in codes if code), args.workers))
+        args.merge = args.workers
+
+    if args.merge:
+        args.shard = None
+        rows = row_selection(args)
+        results = {}
+        calls = []
+        for index in range(args.merge):
+            shard_journal = sharding.shard_journal_path(output_path, index, args.merge)
+            results.update(checkpoint.Journal(shard_journal).load())
+            calls.extend(telemetry.load(call_log_path(args, shard_journal, (index, args.merge))))
+        missing = write_output(learner_records.iter_records(args.input, args.sheet, rows), results, open_output(output_path),
+                               args.coverage_features)
+        print("Merged {} shards into {}".format(args.merge, output_path))
+        if calls:
+            print_telemetry(calls)
+        finish_output(args, output_path, missing)
+        return
+
+    llm_client.configure_cache(enabled=not args.no_cache, path=args.cache_path,
+                               max_bytes=args.cache_max_mb * 1024 * 1024)
+    try:
+        llm_client.configure_backend(args.backend, **mock_settings(args.mock))
+    except ValueError as error:
+        raise SystemExit(str(error))
+    llm_client.configure_calls(requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                               max_retries=args.max_retries, timeout=args.timeout,
+                               structured_outputs=not args.no_structured_outputs, parse_retries=args.parse_retries,
+                               max_in_flight=args.concurrency)
+
+    strategy = strategies.load(args.strategy)
+    if args.model is not None:
+        strategy.MODEL = args.model
+    if args.temperature is not None:
+        strategy.TEMPERATURE = args.temperature
+    if args.multi_criterion and args.strategy not in strategies.MULTI_CRITERION:
+        raise SystemExit("--multi-criterion sends the SR-style single-call prompt; use it with {}, not {}.".format(
+            " or ".join(strategies.MULTI_CRITERION), args.strategy))
+    if getattr(strategy, "MULTI_STAGE", False):
+        try:
+            borderline = [int(score) for score in args.borderline.split(",")] if args.borderline else None
+        except ValueError:
+            raise SystemExit("--borderline expects comma-separated rubric levels, got {!r}".format(args.borderline))
+        try:
+            strategy.configure(escalate_to=args.escalate_to, max_spread=args.max_spread, borderline_scores=borderline)
+        except ValueError as error:
+            raise SystemExit(str(error))
+
+    journal_path = args.journal or os.path.splitext(output_path)[0] + ".journal.jsonl"
+    if args.shard:
+        journal_path = sharding.shard_journal_path(output_path, *shard)
+    journal = checkpoint.Journal(journal_path)
+    if journal.exists() and not args.resume:
+        raise SystemExit("Journal {} already exists. Pass --resume to continue that run, "
+                         "or delete it to start over.".format(journal.path))
+    telemetry.configure(call_log_path(args, journal_path, shard))
+
+    rows = row_selection(args)
+    duplicate_of = find_duplicates(args, rows, run_file_path(journal_path, ".duplicates.csv")) if args.dedupe else None
+    records = learner_records.iter_records(args.input, args.sheet, rows)
+    if args.shard:
+        # A shard worker only writes its journal; --merge assembles the result file
+        grade(args, strategy, records, journal, duplicate_of=duplicate_of)
+    elif args.batch:
+        results = grade_batch(args, strategy, records, journal, output_path, duplicate_of)
+        # Second streaming pass over the input to join the results onto the original columns
+        missing = write_output(learner_records.iter_records(args.input, args.sheet, rows), results, open_output(output_path),
+                               args.coverage_features)
+    else:
+        results, missing = grade(args, strategy, records, journal, open_output(output_path), duplicate_of)
+    print_telemetry(telemetry.records())
+    if hasattr(strategy, "format_escalations"):
+        print("Cascade: " + strategy.format_escalations(strategy.escalation_totals()))
+    if not args.shard:
+        finish_output(args, output_path, missing)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+
+def parse_shard(spec: str) -> tuple:
+    """
+    Parses a shard spec "K/N" (0-based shard K of N).
+
+    Returns:
+        tuple: (index, count)
+
+    Raises:
+        ValueError: If the spec is malformed or K is out of range.
+    """
+    index, sep, count = spec.partition("/")
+    if not sep:
+        raise ValueError("Shard must look like K/N, got {!r}".format(spec))
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError("Shard must look like K/N with whole numbers, got {!r}".format(spec)) from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError("Shard index must be in 0..{} for {} shards, got {}".format(count - 1, count, index))
+    return index, count
+
+
+def shard_rows(rows: list, index: int, count: int) -> list:
+    """
+    Returns the rows of shard index out of count.
+
+    Rows are split into contiguous blocks whose sizes differ by at most one, so
+    the split only depends on the row list and every worker computes the same
+    shards. Contiguous blocks also keep learners of one assignment together,
+    which keeps the provider's prompt-prefix cache warm.
+    """
+    size, extra = divmod(len(rows), count)
+    start = index * size + min(index, extra)
+    end = start + size + (1 if index < extra else 0)
+    return rows[start:end]
+
+
+def shard_journal_path(output_path: str, index: int, count: int) -> str:
+    """Journal (partial result) path of one shard of a run writing to output_path."""
+    return "{}.shard-{}-of-{}.journal.jsonl".format(os.path.splitext(output_path)[0], index, count)
+
+
+def shard_file_path(path: str, index: int, count: int) -> str:
+    """Per-shard variant of a file path given on the command line, e.g. calls.jsonl -> calls.shard-0-of-4.jsonl."""
+    root, ext = os.path.splitext(path)
+    return "{}.shard-{}-of-{}{}".format(root, index, count, ext)
+
+
+def launch_workers(script: str, argv: list, count: int, requests_per_minute: float = None, tokens_per_minute: float = None) -> list:
+    """
+    Runs count local worker processes of script, one per shard, and waits for all of them.
+
+    Client-side rate limits are divided between the workers so that together
+    they stay under the account limits.
+
+    Args:
+        script (str): Path of the script to run (run_assessment.py).
+        argv (list): Command-line arguments shared by all workers.
+        count (int): Number of shards/workers.
+        requests_per_minute (float): Total request limit to split, or None.
+        tokens_per_minute (float): Total token limit to split, or None.
+
+    Returns:
+        list: The exit code of each worker, in shard order.
+    """
+    processes = []
+    for index in range(count):
+        worker_argv = list(argv) + ["--shard", "{}/{}".format(index, count)]
+        if requests_per_minute:
+            worker_argv += ["--rpm", str(requests_per_minute / count)]
+        if tokens_per_minute:
+            worker_argv += ["--tpm", str(tokens_per_minute / count)]
+        processes.append(subprocess.Popen([sys.executable, script] + worker_argv))
+    return [process.wait() for process in processes]
@@ -0,0 +1,44 @@
+import importlib
+
+# Prompt strategy name -> module implementing evaluate_text/build_prompt.
+# Modules are only imported when a strategy is selected, and their model clients
+# are only created on the first call.
+STRATEGIES = {
+    "CoT4": "prompt_final_CoT_4_1",
+    "CoT5": "prompt_final_CoT_5",
+    "nCoT4": "prompt_final_nonCoT_4_1",
+    "nCoT5": "prompt_final_nonCoT_5",
+    "SR4": "prompt_final_SR_4_1",
+    "SR5": "prompt_final_SR_5",
+    # Cheap model first, escalating uncertain evaluations to a stronger strategy
+    "Cascade": "cascade",
+}
+
+DEFAULT_STRATEGY = "SR5"
+
+# Strategies that may score all criteria in one call (--multi-criterion). The single-call
+# prompt (data/prompts/multi_criterion.txt) follows the SR prompts, so it only stands in for those.
+MULTI_CRITERION = ("SR4", "SR5")
+
+
+def names() -> list:
+    """Returns the registered strategy names."""
+    return list(STRATEGIES)
+
+
+def load(name: str):
+    """
+    Returns the prompt module registered under name.
+
+    Args:
+        name (str): A strategy name such as "SR5" or "CoT4".
+
+    Returns:
+        module: The prompt module, exposing evaluate_text, build_prompt and get_chat.
+
+    Raises:
+        ValueError: If no strategy is registered under name.
+    """
+    if name not in STRATEGIES:
+        raise ValueError("Unknown strategy {!r}; choose one of: {}".format(name, ", ".join(STRATEGIES)))
+    return importlib.import_module(STRATEGIES[name])
@@ -0,0 +1,229 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# USD per million tokens: (input, cached input, output). Update when pricing changes;
+# models not listed are reported without a cost.
+MODEL_PRICES = {
+    "gpt-5": (1.25, 0.125, 10.00),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+}
+
+# Fields (strategy, criterion, row, ...) attached to every call made in the current context
+_context = contextvars.ContextVar("telemetry_context", default={})
+
+_records = deque()
+# Running counts over every call of the session, also those no longer in _records
+_TOTAL_KEYS = ("calls", "cache_hits", "errors", "retries", "queue_wait_s", "input_tokens", "cached_input_tokens",
+               "output_tokens", "cost_usd", "unpriced_calls")
+_totals = dict.fromkeys(_TOTAL_KEYS, 0)
+_log = None
+_lock = threading.Lock()
+
+
+def configure(path: str = None, max_records: int = None):
+    """
+    Starts a new telemetry session, optionally logging every call as a JSON line to path.
+
+    Args:
+        path (str): JSONL file the call records are appended to, or None to only keep them in memory.
+        max_records (int): Keep only the most recent call records in memory, e.g. in a long-running
+            service; totals() still counts every call. None keeps all of them.
+    """
+    global _log, _records
+    with _lock:
+        if _log is not None:
+            _log.close()
+        _log = open(path, "a", encoding='utf-8') if path else None
+        _records = deque(maxlen=max_records)
+        _totals.update(dict.fromkeys(_TOTAL_KEYS, 0))
+
+
+@contextlib.contextmanager
+def call_context(**fields):
+    """Attaches fields such as strategy, criterion and row to every call recorded inside the block."""
+    token = _context.set(dict(_context.get(), **fields))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def propagate(function):
+    """Wraps function so it records calls with the current context when run on another thread."""
+    fields = _context.get()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with call_context(**fields):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def cost(model: str, input_tokens: int, cached_input_tokens: int, output_tokens: int):
+    """Estimated USD cost of one call, or None for a model without a price."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    return ((input_tokens - cached_input_tokens) * input_price + cached_input_tokens * cached_price
+            + output_tokens * output_price) / 1e6
+
+
+def record(model: str, wall_s: float, queue_wait_s: float = 0.0, retries: int = 0, input_tokens: int = 0,
+           cached_input_tokens: int = 0, output_tokens: int = 0, cache_hit: bool = False, error: str = None):
+    """
+    Records one model call together with the fields of the current call context.
+
+    Args:
+        model (str): Model name.
+        wall_s (float): Seconds from the start of the call to its response, including waits and retries.
+        queue_wait_s (float): Seconds spent waiting for the client-side rate limiter and a free in-flight slot.
+        retries (int): Attempts retried after a rate limit, timeout or server error.
+        input_tokens, cached_input_tokens, output_tokens (int): Token usage reported for the call.
+        cache_hit (bool): True when the reply came from the local response cache.
+        error (str): Error that ended the call ("unparseable" for a reply that did not parse), if any.
+    """
+    entry = dict(_context.get())
+    entry.update(time=round(time.time(), 3), model=model, wall_s=round(wall_s, 4), queue_wait_s=round(queue_wait_s, 4),
+                 retries=retries, input_tokens=input_tokens, cached_input_tokens=cached_input_tokens,
+                 output_tokens=output_tokens, cache_hit=cache_hit,
+                 cost_usd=cost(model, input_tokens, cached_input_tokens, output_tokens))
+    if error:
+        entry["error"] = error
+    with _lock:
+        _records.append(entry)
+        _totals["cache_hits" if cache_hit else "calls"] += 1
+        _totals["errors"] += 1 if error else 0
+        _totals["retries"] += retries
+        _totals["queue_wait_s"] += queue_wait_s
+        if not cache_hit:
+            _totals["input_tokens"] += input_tokens
+            _totals["cached_input_tokens"] += cached_input_tokens
+            _totals["output_tokens"] += output_tokens
+            if entry["cost_usd"] is None:
+                _totals["unpriced_calls"] += 1
+            else:
+                _totals["cost_usd"] += entry["cost_usd"]
+        if _log is not None:
+            _log.write(json.dumps(entry, default=str) + "\n")
+            _log.flush()
+
+
+def records() -> list:
+    """Returns the call records of the current session (the most recent ones with max_records)."""
+    with _lock:
+        return list(_records)
+
+
+def totals() -> dict:
+    """Counts, tokens and estimated cost of every call of the current session, however many records are kept."""
+    with _lock:
+        counts = dict(_totals)
+    counts.update(queue_wait_s=round(counts["queue_wait_s"], 2), cost_usd=round(counts["cost_usd"], 4))
+    return counts
+
+
+def format_totals(counts: dict) -> str:
+    """Formats totals() as a short report."""
+    return ("{calls} model calls ({cache_hits} cache hits, {errors} errors, {retries} retries), ".format(**counts)
+            + _format_tokens(counts) + ", est. cost ${cost_usd}".format(**counts))
+
+
+def _format_tokens(counts):
+    # Input tokens split by the provider's prompt cache, then output tokens
+    share = counts["cached_input_tokens"] / counts["input_tokens"] if counts["input_tokens"] else 0.0
+    return "{} input tokens ({} cached, {} uncached, {:.0%} from the prompt cache), {} output tokens".format(
+        counts["input_tokens"], counts["cached_input_tokens"], counts["input_tokens"] - counts["cached_input_tokens"],
+        share, counts["output_tokens"])
+
+
+def load(path: str) -> list:
+    """Reads the call records of a JSONL call log, e.g. to summarize the shards of a run; [] if there is none."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: list, q: float) -> float:
+    """q-th percentile (0-100) of values with linear interpolation, or 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summary(entries: list = None) -> dict:
+    """
+    Aggregates call records into latency percentiles, throughput, tokens and cost.
+
+    Args:
+        entries (list): Call records (default: the current session).
+
+    Returns:
+        dict: calls, cache_hits, errors, retries, queue_wait_s, p50/p95/p99 latency of model
+            calls, calls_per_s, tokens, cost_usd, summaries (distinct rows) and cost_per_summary.
+    """
+    entries = records() if entries is None else entries
+    calls = [entry for entry in entries if not entry["cache_hit"]]
+    latencies = [entry["wall_s"] for entry in calls]
+    span = 0.0
+    if entries:
+        span = max(entry["time"] for entry in entries) - min(entry["time"] - entry["wall_s"] for entry in entries)
+    costs = [entry["cost_usd"] for entry in calls if entry["cost_usd"] is not None]
+    summaries = len({entry["row"] for entry in entries if "row" in entry})
+    total_cost = sum(costs)
+    return {
+        "calls": len(calls),
+        "cache_hits": len(entries) - len(calls),
+        "errors": sum(1 for entry in entries if "error" in entry),
+        "retries": sum(entry["retries"] for entry in entries),
+        "queue_wait_s": round(sum(entry["queue_wait_s"] for entry in entries), 2),
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "calls_per_s": round(len(calls) / span, 2) if span > 0 else 0.0,
+        "input_tokens": sum(entry["input_tokens"] for entry in calls),
+        "cached_input_tokens": sum(entry["cached_input_tokens"] for entry in calls),
+        "output_tokens": sum(entry["output_tokens"] for entry in calls),
+        "cost_usd": round(total_cost, 4),
+        "unpriced_calls": len(calls) - len(costs),
+        "summaries": summaries,
+        "cost_per_summary": round(total_cost / summaries, 5) if summaries else 0.0,
+    }
+
+
+def format_summary(totals: dict) -> str:
+    """Formats summary() as a short report."""
+    text = ("{calls} model calls ({cache_hits} cache hits, {errors} errors, {retries} retries), ".format(**totals)
+            + _format_tokens(totals)
+            + (", latency p50 {p50_s}s p95 {p95_s}s p99 {p99_s}s, {calls_per_s} calls/s, rate-limit wait "
+               "{queue_wait_s}s, est. cost ${cost_usd} (${cost_per_summary} per summary)").format(**totals))
+    if totals["unpriced_calls"]:
+        text += ", {} calls to unpriced models".format(totals["unpriced_calls"])
+    return text
+
+
+def format_progress(totals: dict) -> str:
+    """Formats summary() as a short progress note."""
+    return "{calls_per_s} calls/s, p95 {p95_s}s, est. ${cost_usd} so far".format(**totals)
+
+
+def summary_by(field: str, entries: list = None) -> dict:
+    """Returns summary() per value of a record field such as "model", "strategy" or "criterion"."""
+    entries = records() if entries is None else entries
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry.get(field), []).append(entry)
+    return {value: summary(group) for value, group in groups.items()}